@@ -8,4 +8,11 @@ from . import utils
 from .utils import Bcolors as Colors
 from .result import DirResult, Result, Timeable
 from .result import AnalysisResult, ClassResult, MethodResult
-from .evaluate import Evaluate
+
+
+def __getattr__(name):
+    """Import Evaluate (and Z3) only when it is used."""
+    if name == 'Evaluate':
+        from .evaluate import Evaluate
+        return Evaluate
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
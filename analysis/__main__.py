@@ -1,24 +1,31 @@
 #!/usr/bin/env python3
 
 import gc
+import json
 import logging
 import sys
 from argparse import ArgumentParser, Namespace, RawTextHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+from functools import partial
 from os.path import isfile, isdir, join as os_join
 from sys import argv
 from pathlib import Path
+from typing import List, Optional, Union
 
-from . import Colors, utils, Evaluate, Result, DirResult
+from . import Colors, utils, Result, DirResult, AnalysisResult
+from .cache import ResultCache, MethodCache, ShapeCache
+from .lattice import Lattice
+from .policy import Policy
 from . import __version__, __title__ as prog_name
-from .analyzer import choose_analyzer
+from .analyzer import choose_analyzer, AnalysisError
 
 Steps = Enum('Steps', [
     ('PARSE', 'P'), ('ANALYZE', 'A'), ('EVALUATE', 'E')])
 
 
 # noinspection PyUnusedLocal
-def main() -> Result:
+def main() -> Union[Result, DirResult, list]:
     """Command-line interface main routine."""
 
     # parse the command arguments
@@ -31,63 +38,255 @@ def main() -> Result:
     if not args.input:
         parser.print_help()
         sys.exit(1)
+    if args.lattice and not args.policy:
+        parser.error('--lattice requires --policy')
 
     # setup logger utility
     logger = __logger_setup(args.log_level, (
         utils.log_filename(args.input, args.out)
         if args.log else None))
 
-    def analyze_file(in_file):
-        # initialize results objects
-        result = Result(in_file, args.out, args.save,
-                        argv, args.print)
-        # analyzer and solver setup
-        # noinspection PyPep8Naming
-        MyAnalyzer = choose_analyzer(in_file)
-        if MyAnalyzer is None:
-            logger.fatal('No supported analyzer')
+    # source/sink queries only read saved results
+    if args.query:
+        from .query import query
+        found = list(query(args.input, *args.query))
+        for fn, method, src, sink in found:
+            print(f'{fn}\t{method}\t{src} → {sink}')
+        logger.info(f'{len(found)} flows from {args.query[0]} '
+                    f'to {args.query[1]}')
+        return found
+
+    # decision profile of the parser, instead of analysis
+    if args.profile_grammar:
+        return __profile_grammar(args, logger)
+
+    # side file of SMT-LIB encodings starts empty
+    if isinstance(args.smtlib, str):
+        utils.ensure_path(args.smtlib)
+        open(args.smtlib, 'w').close()
+
+    # policies are loaded once, before any work starts
+    policies = lattice = None
+    if args.policy:
+        try:
+            lattice = args.lattice and Lattice.load(args.lattice)
+            policies = Policy.load(args.policy, lattice)
+        except (OSError, ValueError) as e:
+            logger.fatal(f'{Colors.FAIL}Invalid policy file: '
+                         f'{e}{Colors.ENDC}')
             sys.exit(1)
-        result.analyzer = MyAnalyzer.__name__
-        result.solver = Evaluate.info()
-        logger.debug(f'Using {result.analyzer}')
-
-        # run the analyzer
-        result.timers.total.start()
-        analyzer = MyAnalyzer(result)
-        analyzer.parse(result.timers.parse)
-        if args.run == Steps.PARSE.value:
-            result.timers.total.stop()
-            return result.save()
-        analyzer.analyze(result.timers.analysis)
-        if args.run != Steps.ANALYZE.value:
-            gc.collect()
-            Evaluate(result).solve_all(result.timers.eval)
-        result.timers.total.stop()
-        result.save().to_pretty()
-        return result
+
+    # pre-warmed parser, if available
+    dfa = None
+    if args.dfa:
+        from .analyzer.dfa import DfaCache
+        (dfa := DfaCache(args.dfa)).load()
+
+    def show(result: Result) -> Result:
+        return result if args.run == Steps.PARSE.value \
+            else result.to_pretty()
 
     # if input file does not exist,
     # print nice message to explain, then exit.
+    def cleanup():
+        dfa.save() if dfa else None
+        if args.cache:  # one limit for all caches
+            ResultCache(args.cache, args.cache_size).evict()
+
     if isfile(args.input):
-        return analyze_file(args.input)
+        result = show(analyze_file(
+            args.input, args, policies, lattice))
+        cleanup()
+        if result.error:
+            sys.exit(1)
+        return result
     elif isdir(args.input):
-        excl = ([os_join(path) for path in
-                 Path(args.input).rglob(args.exclude)]
-                if args.exclude else [])
-        all_files = [os_join(path) for path in
-                     Path(args.input).rglob('*.*')]
-        files = [f for f in all_files if choose_analyzer(f)
-                 and all(not f.startswith(e) for e in excl)]
+        files = __input_files(args)
         res = DirResult(args.input, len(files), printer=args.print)
-        for fl in files:
-            res.record(analyze_file(fl))
-        res.to_pretty()
+        if args.jobs > 1 and len(files) > 1:
+            logger.debug(f'Using {args.jobs} workers')
+            # map yields in submission order => deterministic record
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                for result in pool.map(
+                        partial(analyze_file, args=args,
+                                policies=policies, lattice=lattice),
+                        files):
+                    res.record(show(result))
+            if dfa:
+                logger.info('DFA cache is not updated by parallel runs')
+                dfa = None
+        else:
+            for fl in files:
+                res.record(show(analyze_file(fl, args, policies, lattice)))
+        cleanup()
+        return res.to_pretty()
     else:
         logger.fatal(f'{Colors.FAIL}File does not exist: '
                      f'{args.input}{Colors.ENDC}')
         sys.exit(1)
 
 
+def __input_files(args: Namespace) -> List[str]:
+    """Analyzable files of an input directory, in name order,
+    except excluded files."""
+    excl = ([os_join(path) for path in
+             Path(args.input).rglob(args.exclude)]
+            if args.exclude else [])
+    all_files = sorted(os_join(path) for path in
+                       Path(args.input).rglob('*.*'))
+    return [f for f in all_files if choose_analyzer(f)
+            and all(not f.startswith(e) for e in excl)]
+
+
+def __profile_grammar(args: Namespace, logger: logging.Logger):
+    """Profile parser decisions over the input file or directory,
+    and print a ranked report."""
+    from .analyzer.profile import profile
+    from .analyzer import JavaAnalyzer
+    files = [args.input] if isfile(args.input) else \
+        __input_files(args) if isdir(args.input) else []
+    if not (files := [f for f in files if JavaAnalyzer.lang_match(f)]):
+        logger.fatal(f'{Colors.FAIL}No Java files: '
+                     f'{args.input}{Colors.ENDC}')
+        sys.exit(1)
+    prof = profile(files)
+    print(prof.report())
+    if isinstance(args.profile_grammar, str):
+        utils.ensure_path(args.profile_grammar)
+        with open(args.profile_grammar, 'w') as fl:
+            json.dump(prof.to_json(), fl, indent=4)
+        logger.info(f'Wrote to: {args.profile_grammar}')
+    return prof
+
+
+def analyze_file(in_file: str, args: Namespace,
+                 policies: Optional[List[Policy]] = None,
+                 lattice: Optional[Lattice] = None) -> Result:
+    """Runs the analyzer steps on a single input file.
+
+    This is a module-level function, so that it can be
+    dispatched to worker processes in a directory run.
+
+    Arguments:
+        in_file: path to an input program.
+        args: parsed command arguments.
+        policies: security policies loaded from args.policy.
+        lattice: security lattice loaded from args.lattice.
+
+    Returns:
+        The (saved) result of analyzing the input file.
+    """
+    logger = logging.getLogger(prog_name)
+    # initialize results objects
+    result = Result(in_file, args.out, args.save,
+                    argv, args.print)
+    # analyzer and solver setup
+    # noinspection PyPep8Naming
+    MyAnalyzer = choose_analyzer(in_file)
+    if MyAnalyzer is None:
+        logger.fatal('No supported analyzer')
+        sys.exit(1)
+    result.analyzer = MyAnalyzer.__name__
+    logger.debug(f'Using {result.analyzer}')
+    if evaluate := (args.run == Steps.EVALUATE.value):
+        # loading the solver is expensive => only when needed
+        from .evaluate import Evaluate
+        result.solver = Evaluate.info(args.solver) + (
+            f' (reduce: {args.reduce})' if args.reduce else '')
+
+    # reuse a previous result, if input is unchanged
+    cache = ResultCache(args.cache, args.cache_size) \
+        if args.cache and args.run != Steps.PARSE.value else None
+    # SMT-LIB encodings are only kept when needed
+    smtlib = evaluate and bool(args.save or args.smtlib)
+    key = cache.key(
+        in_file, analyzer=result.analyzer, run=args.run,
+        version=MyAnalyzer.version(), solver=result.solver,
+        method=args.method,
+        smtlib=smtlib, policy=args.policy and utils.digest(
+            args.policy), lattice=args.lattice and utils.digest(
+            args.lattice)) if cache else None
+    result.timers.total.start()
+    if cache and (data := cache.get(key)):
+        logger.debug(f'Cache hit {in_file}')
+        result.reconstruct(data)
+        result.infile, result.cmd = in_file, argv
+        result.cache = 'hit'
+        # method times were measured by the run that cached them
+        for method in [m for c in result.analysis_result.values()
+                       for m in c.values()]:
+            method.pop('timing', None)
+        __write_smtlib(result, args.smtlib)
+        result.timers.total.stop()
+        return result.save()
+
+    # run the analyzer
+    methods = MethodCache(args.cache, args.cache_size,
+                          result.solver) if cache else None
+    phase = 'parse'
+    try:
+        analyzer = MyAnalyzer(result, methods, args.method)
+        analyzer.parse(result.timers.parse, result.timers.lex)
+        if args.run != Steps.PARSE.value:
+            phase = 'analysis'
+            analyzer.analyze(result.timers.analysis)
+        if evaluate:
+            phase = 'evaluation'
+            gc.collect()
+            memo = ShapeCache(args.cache, args.cache_size, args.memo) \
+                if args.memo else None
+            Evaluate(result, args.solver, smtlib, args.reduce, memo,
+                     args.timeout, args.budget, policies,
+                     lattice=lattice) \
+                .solve_all(result.timers.eval, args.eval_jobs)
+    except Exception as e:
+        # one failing file must not end a directory run
+        error = e if isinstance(e, AnalysisError) else AnalysisError(
+            'input' if isinstance(e, (OSError, UnicodeError)) else phase,
+            f'{type(e).__name__}: {e}')
+        at = DirResult.position(error.info)
+        logger.error(f'{Colors.FAIL}Failed {in_file}{at}: '
+                     f'{error.category}: {error}{Colors.ENDC}')
+        logger.debug('Failure', exc_info=True)
+        result.error = error.info
+        result.setdefault(Result.AR, AnalysisResult())
+        result.timers.total.stop()
+        return result.save()
+    result.timers.total.stop()
+    if cache:
+        result.cache = 'miss'
+        # results that gave up might be decided on another run
+        if not any(m.sat == 'UNKNOWN' for c in result.get(
+                Result.AR, {}).values() for m in c.values()):
+            cache.put(key, result)
+        methods.store(result)
+    __write_smtlib(result, args.smtlib)
+    return result.save()
+
+
+def __write_smtlib(result: Result, path: Union[str, bool, None]) -> None:
+    """Move SMT-LIB encodings of methods to a side file.
+
+    The file is appended to, so a directory run collects all
+    files. Every method is a scope of a runnable SMT-LIB script.
+
+    Arguments:
+        result: an evaluated result.
+        path: side file; if not a path, encodings stay in result.
+    """
+    if not isinstance(path, str) or Result.AR not in result:
+        return
+    scripts = [f'; {result.infile}\n']
+    for method in [m for c in result.analysis_result.values()
+                   for m in c.values() if m.smtlib]:
+        scripts.append(f'; {method.full_name}\n(push)\n{method.smtlib}'
+                       f'(check-sat)\n(pop)\n')
+        method.smtlib = None
+    utils.ensure_path(path)
+    with open(path, 'a') as fl:
+        fl.write(''.join(scripts))  # one write: workers may append
+
+
 def __logger_setup(level_arg: int, log_filename: str = None) \
         -> logging.Logger:
     """Setup logger.
@@ -165,6 +364,98 @@ def __parse_args(parser: ArgumentParser) -> Namespace:
         help='for directory input: exclude RE-pattern match',
         metavar="RE",
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        action='store',
+        dest='jobs',
+        help='for directory input: number of parallel\n'
+             'worker processes (default: 1)',
+        metavar="N",
+        default=1,
+        type=int
+    )
+    parser.add_argument(
+        '-s', '--solver',
+        action='store',
+        choices=['z3', 'native', 'check'],
+        dest='solver',
+        help='constraint solver\nz3=Z3, native=graph-based,\n'
+             'check=native, validated by Z3\n(default: z3)',
+        default='z3',
+        type=str.lower
+    )
+    parser.add_argument(
+        '--reduce',
+        action='store',
+        dest='reduce',
+        nargs='?',
+        const='scc',
+        choices=['scc', 'interface'],
+        help='reduce constraints before solving\n'
+             'scc=collapse cycles, drop unused variables\n'
+             'interface=also project onto parameters,\n'
+             'fields, and returns (default: scc)',
+        metavar="MODE",
+    )
+    parser.add_argument(
+        '--memo',
+        action='store',
+        dest='memo',
+        nargs='?',
+        const=4096,
+        help='reuse solver results of methods with the same\n'
+             'constraints up to renaming; keep N in memory\n'
+             '(default: 4096), and persist them with --cache',
+        metavar="N",
+        type=int
+    )
+    parser.add_argument(
+        '--timeout',
+        action='store',
+        dest='timeout',
+        help='evaluation time limit per method; undecided\n'
+             'methods are UNKNOWN',
+        metavar="SEC",
+        type=float
+    )
+    parser.add_argument(
+        '--budget',
+        action='store',
+        dest='budget',
+        help='evaluation time limit per file; methods not\n'
+             'decided within the budget are UNKNOWN',
+        metavar="SEC",
+        type=float
+    )
+    parser.add_argument(
+        '--policy',
+        action='store',
+        dest='policy',
+        help='check methods against the security policies\n'
+             'in FILE (JSON), that fix levels of variables\n'
+             'of matching methods',
+        metavar="FILE",
+    )
+    parser.add_argument(
+        '--lattice',
+        action='store',
+        dest='lattice',
+        help='policy levels are elements of the finite\n'
+             'security lattice in FILE (JSON), instead of\n'
+             'integers; requires --policy. Lattice policies\n'
+             'are solved by native join propagation; with\n'
+             '--solver check, also by Z3 with bitvectors',
+        metavar="FILE",
+    )
+    parser.add_argument(
+        '--eval-jobs',
+        action='store',
+        dest='eval_jobs',
+        help='number of solver threads per file (default: 1)',
+        metavar="N",
+        default=1,
+        type=int
+    )
     parser.add_argument(
         '-p', '--print',
         action='store',
@@ -190,6 +481,72 @@ def __parse_args(parser: ArgumentParser) -> Namespace:
         action='store_true',
         help='save analyzer results to a file'
     )
+    parser.add_argument(
+        '--smtlib',
+        action='store',
+        dest='smtlib',
+        nargs='?',
+        const=True,
+        help='keep SMT-LIB encodings of methods in results\n'
+             '(implied by --save); with FILE, append them\n'
+             'to FILE instead',
+        metavar="FILE",
+    )
+    parser.add_argument(
+        '-m', '--method',
+        action='append',
+        dest='method',
+        help='analyze only methods matching a pattern, e.g.\n'
+             '"Program.main" or "*.get*"; parse only their\n'
+             'bodies (repeatable)',
+        metavar="CLASS.NAME",
+    )
+    parser.add_argument(
+        '--query',
+        action='store',
+        dest='query',
+        nargs=2,
+        help='list flows from SRC to SINK variables (names\n'
+             'or glob patterns) in saved results: a JSON\n'
+             'file, a directory, or an archive',
+        metavar=('SRC', 'SINK'),
+    )
+    parser.add_argument(
+        '--profile-grammar',
+        action='store',
+        dest='profile_grammar',
+        nargs='?',
+        const=True,
+        help='profile parser decisions instead of analyzing,\n'
+             'and show the most expensive decisions by rule;\n'
+             'with FILE, also write the full profile (JSON)',
+        metavar="FILE",
+    )
+    parser.add_argument(
+        '--dfa',
+        action='store',
+        dest='dfa',
+        help='load pre-warmed parser DFA from FILE,\n'
+             'and write it back after the run',
+        metavar="FILE",
+    )
+    parser.add_argument(
+        '--cache',
+        action='store',
+        dest='cache',
+        help='reuse results of unchanged files,\n'
+             'cached in directory DIR',
+        metavar="DIR",
+    )
+    parser.add_argument(
+        '--cache-size',
+        action='store',
+        dest='cache_size',
+        help='cache size limit in megabytes (default: 256)',
+        metavar="MB",
+        default=256,
+        type=float
+    )
     parser.add_argument(
         '--log',
         action='store_true',
@@ -1,9 +1,25 @@
+from importlib import import_module
+from os.path import splitext
 from typing import Optional, Type
 
 # flake8: noqa: F401
-from .base import AbstractAnalyzer, BaseVisitor, FLOW_T
-from .java import JavaAnalyzer
-from .json import JsonLoader
+from .base import AbstractAnalyzer, AnalysisError, BaseVisitor, \
+    NameTable, FlowMatrix, FLOW_T, VAR_T
+
+ANALYZERS = {
+    '.java': ('.java', 'JavaAnalyzer'),
+    '.json': ('.json', 'JsonLoader'),
+}
+"""Analyzers by file extension: (module, class name).
+Analyzer modules are imported on first use, since e.g.
+the Java frontend is expensive to load."""
+
+
+def __getattr__(name):
+    for module, cls in ANALYZERS.values():
+        if cls == name:
+            return getattr(import_module(module, __name__), cls)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def choose_analyzer(input_file: str) \
@@ -16,8 +32,8 @@ def choose_analyzer(input_file: str) \
     Returns:
         Applicable analyzer (if any).
     """
-    if JavaAnalyzer.lang_match(input_file):
-        return JavaAnalyzer
-    if JsonLoader.lang_match(input_file):
-        return JsonLoader
+    if (ext := splitext(input_file)[1]) in ANALYZERS:
+        analyzer = __getattr__(ANALYZERS[ext][1])
+        if analyzer.lang_match(input_file):
+            return analyzer
     return None
@@ -2,18 +2,54 @@ from __future__ import annotations
 
 import logging
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Optional, Iterable
+from typing import List, Tuple, Optional, Iterable, Dict, Union
 
 from analysis import Result, Timeable, AnalysisResult, Colors
+from analysis import __version__
+from analysis.cache import MethodCache
 
 logger = logging.getLogger(__name__)
 
 FLOW_T = List[Tuple[str, str]]
 """Type of data flow-pairs."""
 
+VAR_T = int
+"""Type of an interned variable."""
+
+
+class AnalysisError(Exception):
+    """Failure to analyze an input file.
+
+    The error is recorded in the result, so that a directory
+    run can continue with the next file.
+    """
+
+    def __init__(self, category: str, message: str,
+                 line: Optional[int] = None, column: Optional[int] = None):
+        """Initialize an analysis error.
+
+        Arguments:
+            category: kind of failure, e.g., syntax, analysis.
+            message: description of the failure.
+            line: line of the input where it failed, if known.
+            column: column of the input where it failed, if known.
+        """
+        super().__init__(message)
+        self.category = category
+        self.message = message
+        self.line = line
+        self.column = column
+
+    @property
+    def info(self) -> Dict[str, Optional[Union[str, int]]]:
+        """The error, as saved in the result."""
+        return {'category': self.category, 'message': self.message,
+                'line': self.line, 'column': self.column}
+
 
 class AbstractAnalyzer(ABC):
-    def __init__(self, result: Result):
+    def __init__(self, result: Result, cache: MethodCache = None,
+                 select: Optional[List[str]] = None):
         """A base class for an analyzer.
 
         This class defines the interface for an analyzer
@@ -22,9 +58,15 @@ class AbstractAnalyzer(ABC):
 
         Arguments:
             result: Initialized results object.
+            cache: Method-level cache, if the analyzer uses one.
+            select: glob patterns of method full names (e.g.
+                `Program.*`); if given, only matching methods
+                are analyzed.
         """
         assert result
         self._result = result
+        self.cache = cache
+        self.select = select
         self.tree = None
 
     @property
@@ -51,13 +93,26 @@ class AbstractAnalyzer(ABC):
         """
         return False
 
+    @staticmethod
+    def version() -> str:
+        """Version of the analyzer.
+
+        Returns:
+            A version string that changes whenever the
+            analyzer would produce different results.
+        """
+        return __version__
+
     @abstractmethod
-    def parse(self, t: Optional[Timeable] = None) \
+    def parse(self, t: Optional[Timeable] = None,
+              lex: Optional[Timeable] = None) \
             -> AbstractAnalyzer:  # pragma: no cover
         """Parses the input file.
 
         Arguments:
             t: time-measuring utility
+            lex: time-measuring utility for lexing, if it is
+              timed separately
 
         Returns:
             The analyzer object.
@@ -145,3 +200,142 @@ class BaseVisitor(ABC):
         numbers = '₀,₁,₂,₃,₄,₅,₆,₇,₈,₉'.split(',')
         int_chars = [int(c) for c in str(n)]
         return ''.join([numbers[i] for i in int_chars])
+
+
+class NameTable:
+    """Interned variable names of an analyzed method.
+
+    Variables are represented by integer IDs, in order of
+    interning. Renaming a variable means mapping its ID to
+    another ID, and the table only grows.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []  # ID -> name
+        self.ids: Dict[str, VAR_T] = {}  # name -> ID
+        self.next_sub: Dict[str, int] = {}  # base name -> next subscript
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, name: str) -> VAR_T:
+        """Get the ID of a variable name, adding it if needed."""
+        if (var := self.ids.get(name)) is None:
+            self.ids[name] = var = len(self.names)
+            self.names.append(name)
+        return var
+
+    def intern_all(self, names: Iterable[str]) -> set[VAR_T]:
+        """Get the IDs of several variable names."""
+        return {self.intern(n) for n in names}
+
+    def name(self, var: VAR_T) -> str:
+        """Get the name of a variable ID."""
+        return self.names[var]
+
+    def names_of(self, variables: Iterable[VAR_T]) -> set[str]:
+        """Get the names of several variable IDs."""
+        return {self.names[v] for v in variables}
+
+    def fmt(self, variables: Iterable[VAR_T]) -> str:
+        """Comma-separated names of variables, for logging."""
+        return ', '.join(self.names[v] for v in variables)
+
+    def fresh(self, var: VAR_T, start: int = 2) -> VAR_T:
+        """Create a new variable, named after an existing one.
+
+        Subscripts are counted per base name, so this does not
+        rescan known names; cf. BaseVisitor.uniq_name.
+
+        Arguments:
+            var: variable whose name is the base name.
+            start: lowest subscript to use.
+
+        Returns:
+            ID of a variable whose name was never used before.
+        """
+        base = self.names[var]
+        n = max(self.next_sub.get(base, start), start)
+        while (name := f'{base}{BaseVisitor.u_sub(n)}') in self.ids:
+            n += 1
+        self.next_sub[base] = n + 1
+        return self.intern(name)
+
+    def unused(self, var: VAR_T, known: Iterable[VAR_T],
+               start: int = 0) -> VAR_T:
+        """Variable named after an existing one, with the lowest
+        subscript that is not a known variable, as by
+        BaseVisitor.uniq_name. Unlike fresh, the name may have
+        been used before, e.g., in a sibling scope.
+
+        Arguments:
+            var: variable whose name is the base name.
+            known: variables in scope.
+            start: lowest subscript to use.
+
+        Returns:
+            ID of a variable that is not known.
+        """
+        base, n = self.names[var], start
+        while (new := self.intern(
+                f'{base}{BaseVisitor.u_sub(n)}')) in known:
+            n += 1
+        return new
+
+
+class FlowMatrix:
+    """Data-flow matrix over interned variables.
+
+    Each source variable maps to a bitset of the variables it
+    flows into. Pairs are deduplicated on insert, and reflexive
+    flows are never stored, since they are irrelevant to the
+    analysis.
+    """
+
+    def __init__(self, rows: Optional[Dict[VAR_T, int]] = None):
+        self.rows: Dict[VAR_T, int] = rows or {}  # source -> targets
+
+    def __len__(self) -> int:
+        return sum(t.bit_count() for t in self.rows.values())
+
+    def __iter__(self) -> Iterable[Tuple[VAR_T, VAR_T]]:
+        for src, targets in self.rows.items():
+            while targets:
+                low = targets & -targets
+                yield src, low.bit_length() - 1
+                targets ^= low
+
+    def __ior__(self, other: FlowMatrix) -> FlowMatrix:
+        for src, targets in other.rows.items():
+            self.rows[src] = self.rows.get(src, 0) | targets
+        return self
+
+    def add(self, in_v: Iterable[VAR_T], out_v: Iterable[VAR_T]) -> None:
+        """Insert the flows of every in-variable to every
+        out-variable (outer product).
+
+        Arguments:
+            in_v: source variables.
+            out_v: target variables.
+        """
+        mask = 0
+        for out in out_v:
+            mask |= 1 << out
+        if mask:
+            for src in in_v:
+                if targets := mask & ~(1 << src):
+                    self.rows[src] = self.rows.get(src, 0) | targets
+
+    def renamed(self, alias: Dict[VAR_T, VAR_T]) -> FlowMatrix:
+        """Copy of the matrix with variables substituted.
+
+        Arguments:
+            alias: substitution of variables.
+
+        Returns:
+            A new matrix.
+        """
+        result = FlowMatrix()
+        for src, out in self:
+            result.add((alias.get(src, src),), (alias.get(out, out),))
+        return result
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import inspect
+import json
+import logging
+import os
+from importlib import metadata
+from typing import Optional, List, Dict, Any
+
+from antlr4 import Parser
+from antlr4.PredictionContext import PredictionContext, \
+    SingletonPredictionContext, ArrayPredictionContext
+from antlr4.atn.ATNConfig import ATNConfig
+from antlr4.atn.ATNConfigSet import ATNConfigSet
+from antlr4.atn.ATNSimulator import ATNSimulator
+from antlr4.atn.SemanticContext import SemanticContext, Predicate, \
+    PrecedencePredicate, AND, OR
+from antlr4.dfa.DFAState import DFAState, PredPrediction
+
+from analysis import utils
+from analysis.parser import JavaParser
+from .java import GRAMMAR
+
+logger = logging.getLogger(__name__)
+
+
+class DfaCache:
+    """Persists the warmed-up prediction DFA of a generated parser.
+
+    ANTLR parsers build their lookahead DFA lazily, as adaptive
+    prediction encounters new inputs. The DFA lives in class
+    attributes of the generated parser (`decisionsToDFA` and
+    `sharedContextCache`), so within one process it is shared
+    by all parses, but every new process starts cold.
+
+    This class writes the DFA states to a file, after a run,
+    and re-populates the parser DFA from the file on startup.
+    ATN states are saved by number and resolved against the
+    parser ATN on load. The file records a fingerprint of the
+    grammar and the generated parser; if those no longer match,
+    the saved cache is ignored.
+
+    Example:
+
+    ```python
+    cache = DfaCache('out/java.dfa')
+    cache.load()
+    ...  # parse files
+    cache.save()
+    ```
+    """
+
+    VERSION = 1
+    ERROR = -1  # edge target: known to lead nowhere
+
+    def __init__(self, path: str, parser: type[Parser] = JavaParser,
+                 grammar: Optional[str] = GRAMMAR):
+        """Initialize a DFA cache.
+
+        Arguments:
+            path: cache file path.
+            parser: generated parser class.
+            grammar: path to the grammar of the parser (if any).
+        """
+        self.path = path
+        self.parser = parser
+        self.grammar = grammar
+        self.loaded = 0
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the grammar, parser, and runtime versions."""
+        files = utils.digest(inspect.getfile(self.parser), self.grammar)
+        runtime = metadata.version('antlr4-python3-runtime')
+        return f'{self.VERSION}:{runtime}:{files}'
+
+    @property
+    def n_states(self) -> int:
+        """Total number of DFA states of the parser."""
+        return sum(len(dfa.states) for dfa in self.parser.decisionsToDFA)
+
+    def load(self) -> bool:
+        """Populate the parser DFA from the cache file.
+
+        The DFA is only populated if it is still empty, i.e.,
+        before anything has been parsed.
+
+        Returns:
+            True if the cache was loaded.
+        """
+        if not os.path.isfile(self.path):
+            logger.debug(f'no DFA cache: {self.path}')
+            return False
+        if self.n_states > 0:
+            logger.debug('parser DFA is already warm')
+            return False
+        try:
+            with open(self.path) as fl:
+                data = json.load(fl)
+        except (OSError, ValueError) as e:
+            logger.warning(f'unreadable DFA cache {self.path}: {e}')
+            return False
+        if data.get('fingerprint') != self.fingerprint:
+            logger.warning('DFA cache does not match grammar, ignored')
+            return False
+        contexts = self.__dec_contexts(data['contexts'])
+        for ctx in contexts:
+            self.parser.sharedContextCache.add(ctx)
+        for entry in data['dfa']:
+            self.__dec_dfa(entry, contexts)
+        self.loaded = self.n_states
+        logger.debug(f'loaded {self.loaded} DFA states: {self.path}')
+        return True
+
+    def save(self) -> bool:
+        """Write the current parser DFA to the cache file.
+
+        Nothing is written if the DFA has not grown since it
+        was loaded.
+
+        Returns:
+            True if the cache was written.
+        """
+        if self.n_states <= self.loaded:
+            logger.debug('DFA unchanged, cache not updated')
+            return False
+        ctx_ids: Dict[int, int] = {}
+        contexts: List[list] = []
+        dfa = [self.__enc_dfa(d, ctx_ids, contexts)
+               for d in self.parser.decisionsToDFA if d.states]
+        utils.ensure_path(self.path)
+        with open(self.path, 'w') as fl:
+            json.dump({'fingerprint': self.fingerprint,
+                       'contexts': contexts, 'dfa': dfa}, fl)
+        logger.info(f'Wrote {self.n_states} DFA states to: {self.path}')
+        return True
+
+    # encoding ────────────────────────────────────────────────────
+
+    @staticmethod
+    def __enc_context(ctx: Optional[PredictionContext],
+                      ids: Dict[int, int], out: List[list]) \
+            -> Optional[int]:
+        """Encode a prediction context graph; parents first."""
+        if ctx is None:
+            return None
+        if id(ctx) in ids:
+            return ids[id(ctx)]
+        if ctx is PredictionContext.EMPTY:
+            entry = ['E']
+        elif isinstance(ctx, ArrayPredictionContext):
+            entry = ['A', [DfaCache.__enc_context(p, ids, out)
+                           for p in ctx.parents], list(ctx.returnStates)]
+        else:
+            entry = ['S', DfaCache.__enc_context(ctx.parentCtx, ids, out),
+                     ctx.returnState]
+        ids[id(ctx)] = len(out)
+        out.append(entry)
+        return ids[id(ctx)]
+
+    @staticmethod
+    def __enc_semantic(sem: SemanticContext) -> Any:
+        if sem is None or sem is SemanticContext.NONE:
+            return None
+        if isinstance(sem, Predicate):
+            return ['P', sem.ruleIndex, sem.predIndex, sem.isCtxDependent]
+        if isinstance(sem, PrecedencePredicate):
+            return ['PP', sem.precedence]
+        return ['AND' if isinstance(sem, AND) else 'OR',
+                [DfaCache.__enc_semantic(o) for o in sem.opnds]]
+
+    def __enc_state(self, state: DFAState, ids, contexts) -> list:
+        configs = state.configs
+        return [
+            state.stateNumber, state.isAcceptState, state.prediction,
+            state.requiresFullContext,
+            None if state.predicates is None else [
+                [p.alt, self.__enc_semantic(p.pred)]
+                for p in state.predicates],
+            [configs.fullCtx, configs.uniqueAlt,
+             None if configs.conflictingAlts is None
+             else sorted(configs.conflictingAlts),
+             configs.hasSemanticContext, configs.dipsIntoOuterContext],
+            [[c.state.stateNumber, c.alt,
+              self.__enc_context(c.context, ids, contexts),
+              self.__enc_semantic(c.semanticContext),
+              c.reachesIntoOuterContext, c.precedenceFilterSuppressed]
+             for c in configs],
+            [] if state.edges is None else [
+                [i, self.ERROR if t is ATNSimulator.ERROR
+                 else t.stateNumber]
+                for i, t in enumerate(state.edges) if t is not None]]
+
+    def __enc_dfa(self, dfa, ids, contexts) -> dict:
+        states = [self.__enc_state(s, ids, contexts) for s in dfa.states]
+        if dfa.precedenceDfa:
+            start = [[i, s.stateNumber] for i, s in
+                     enumerate(dfa.s0.edges) if s is not None]
+        else:
+            start = None if dfa.s0 is None else dfa.s0.stateNumber
+        return {'decision': dfa.decision, 'states': states, 's0': start}
+
+    # decoding ────────────────────────────────────────────────────
+
+    @staticmethod
+    def __dec_contexts(entries: List[list]) -> List[PredictionContext]:
+        contexts = []
+        for entry in entries:
+            parent = (lambda i: None if i is None else contexts[i])
+            if entry[0] == 'E':
+                ctx = PredictionContext.EMPTY
+            elif entry[0] == 'A':
+                ctx = ArrayPredictionContext(
+                    [parent(p) for p in entry[1]], list(entry[2]))
+            else:
+                ctx = SingletonPredictionContext.create(
+                    parent(entry[1]), entry[2])
+            contexts.append(ctx)
+        return contexts
+
+    @staticmethod
+    def __dec_semantic(data: Any) -> SemanticContext:
+        if data is None:
+            return SemanticContext.NONE
+        if data[0] == 'P':
+            return Predicate(*data[1:])
+        if data[0] == 'PP':
+            return PrecedencePredicate(data[1])
+        # keep saved operand order, so equality holds
+        sem = (AND if data[0] == 'AND' else OR).__new__(
+            AND if data[0] == 'AND' else OR)
+        sem.opnds = [DfaCache.__dec_semantic(o) for o in data[1]]
+        return sem
+
+    def __dec_state(self, data: list, contexts) -> DFAState:
+        num, accept, prediction, full_ctx, preds, meta, cfgs, _ = data
+        atn_states = self.parser.atn.states
+        configs = ATNConfigSet(meta[0])
+        configs.uniqueAlt = meta[1]
+        configs.conflictingAlts = None if meta[2] is None else set(meta[2])
+        configs.hasSemanticContext, configs.dipsIntoOuterContext = meta[3:]
+        for (st, alt, ctx, sem, reach, suppressed) in cfgs:
+            config = ATNConfig(
+                state=atn_states[st], alt=alt,
+                context=None if ctx is None else contexts[ctx],
+                semantic=self.__dec_semantic(sem))
+            config.reachesIntoOuterContext = reach
+            config.precedenceFilterSuppressed = suppressed
+            configs.configs.append(config)
+        configs.setReadonly(True)
+        state = DFAState(num, configs)
+        state.isAcceptState = accept
+        state.prediction = prediction
+        state.requiresFullContext = full_ctx
+        state.predicates = None if preds is None else [
+            PredPrediction(self.__dec_semantic(p), alt)
+            for alt, p in preds]
+        return state
+
+    def __dec_dfa(self, data: dict, contexts) -> None:
+        dfa = self.parser.decisionsToDFA[data['decision']]
+        states = {d[0]: self.__dec_state(d, contexts)
+                  for d in data['states']}
+        target = (lambda n: ATNSimulator.ERROR
+                  if n == self.ERROR else states[n])
+        for entry in data['states']:
+            state, edges = states[entry[0]], entry[-1]
+            if edges:
+                state.edges = [None] * (self.parser.atn.maxTokenType + 2)
+                for i, n in edges:
+                    state.edges[i] = target(n)
+            dfa.states[state] = state
+        if dfa.precedenceDfa:
+            for prec, n in data['s0'] or []:
+                dfa.setPrecedenceStartState(prec, states[n])
+        elif data['s0'] is not None:
+            dfa.s0 = states[data['s0']]
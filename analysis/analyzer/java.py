@@ -1,20 +1,33 @@
 from __future__ import annotations
 
+import hashlib
+import inspect
 import logging
-import operator
-import sys
-from functools import reduce
-from itertools import product
+import os
+import time
+from functools import reduce, cache
 from typing import Optional, Union, List, Tuple
 
-from antlr4 import FileStream, CommonTokenStream
+from antlr4 import FileStream, CommonTokenStream, PredictionMode, Token
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy, \
+    DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
 
 from analysis import AnalysisResult, ClassResult, MethodResult, Timeable
+from analysis import utils
+from analysis.cache import MethodCache
 from analysis.parser import JavaLexer, JavaParser, JavaParserVisitor
-from . import AbstractAnalyzer, BaseVisitor, FLOW_T
+from . import AbstractAnalyzer, AnalysisError, BaseVisitor, NameTable, \
+    FlowMatrix, FLOW_T, VAR_T
+from .prescan import MethodSpan, scan
 
 logger = logging.getLogger(__name__)
 
+GRAMMAR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'grammars', 'JavaParser.g4')
+"""Grammar the generated Java parser was built from."""
+
 
 class JavaAnalyzer(AbstractAnalyzer):
     """Analyzer for Java programming language.
@@ -26,8 +39,22 @@ class JavaAnalyzer(AbstractAnalyzer):
     ```python
     JavaAnalyzer(program).parse().analyze()
     ```
+
+    With selected methods, the file is only tokenized and
+    pre-scanned for method boundaries (see prescan), and only
+    the bodies of the selected methods are parsed and analyzed.
+
+    ```python
+    JavaAnalyzer(program, select=['Program.ma*']).parse().analyze()
+    ```
     """
 
+    def __init__(self, result, cache=None, select=None):
+        super().__init__(result, cache, select)
+        self.bodies: Optional[List[Tuple[
+            MethodSpan, JavaParser.MethodBodyContext]]] = None
+        self.errors = SyntaxErrors()
+
     @staticmethod
     def lang_match(input_file: str) -> bool:
         """Analyzes any file with .java extension.
@@ -43,11 +70,30 @@ class JavaAnalyzer(AbstractAnalyzer):
         """
         return input_file.endswith('.java')
 
-    def parse(self, t: Optional[Timeable] = None) -> JavaAnalyzer:
+    @staticmethod
+    @cache
+    def version() -> str:
+        """Analyzer version, including grammar and parser."""
+        parser = utils.digest(
+            GRAMMAR, inspect.getfile(JavaLexer),
+            inspect.getfile(JavaParser))
+        return f'{AbstractAnalyzer.version()}+{parser[:16]}'
+
+    def parse(self, t: Optional[Timeable] = None,
+              lex: Optional[Timeable] = None) -> JavaAnalyzer:
         """Attempt to parse the input file.
 
+        Parsing is two-staged: the first attempt uses the faster
+        SLL prediction mode and bails out on the first error.
+        Only if that fails, the input is re-parsed in full LL mode.
+        The mode that succeeded is recorded in the result.
+
+        The input is tokenized entirely before parsing, so that
+        lexing and parsing are timed separately.
+
         Arguments:
-            t: timing utility
+            t: timing utility, for parsing
+            lex: timing utility, for lexing
 
         Raises:
             AssertionError: if input file is not analyzable,
@@ -55,25 +101,90 @@ class JavaAnalyzer(AbstractAnalyzer):
             AssertionError: if input file cannot be parsed by
               the parser. The feedback here is not informative;
               so make sure to follow the grammar.
+            AnalysisError: if the input has syntax errors; the
+              position of the first error is recorded.
 
         Returns:
             The analyzer.
         """
         assert JavaAnalyzer.lang_match(self.input_file)
         logger.debug(f'parsing {self.input_file}')
-        t.start() if t else None
+        lex.start() if lex else None
         input_stream = FileStream(self.input_file, encoding="UTF-8")
         lexer = JavaLexer(input_stream)
+        lexer.removeErrorListeners()
+        lexer.addErrorListener(self.errors)
         stream = CommonTokenStream(lexer)
+        stream.fill()
+        lex.stop() if lex else None
+        t.start() if t else None
         parser = JavaParser(stream)
+        if self.select:
+            self.bodies = self.parse_methods(parser, stream)
+        else:
+            self.tree = self.two_stage(parser, stream)
         t.stop() if t else None
-        self.tree = parser.compilationUnit()
-        if parser.getNumberOfSyntaxErrors() > 0:
-            logger.fatal("input syntax is invalid")
-            sys.exit(1)
-        logger.debug("parsed successfully")
+        if self.errors.errors:
+            raise self.errors.error()
+        logger.debug(f"parsed successfully ({self._result.parse_mode})")
         return self
 
+    def two_stage(self, parser: JavaParser, stream: CommonTokenStream,
+                  rule: str = 'compilationUnit', start: int = 0) \
+            -> JavaParser.CompilationUnitContext:
+        """Parse first in SLL mode, then fall back to LL mode.
+
+        Arguments:
+            parser: the parser, initialized with default settings.
+            stream: the token stream of the parser.
+            rule: name of the entry rule.
+            start: token index where parsing starts.
+
+        Returns:
+            The parse tree.
+        """
+        parser.removeErrorListeners()
+        parser._errHandler = BailErrorStrategy()
+        parser._interp.predictionMode = PredictionMode.SLL
+        stream.seek(start)
+        try:
+            tree = getattr(parser, rule)()
+            self._result.parse_mode = PredictionMode.SLL.name
+            return tree
+        except ParseCancellationException:
+            logger.debug("SLL parse failed, retrying with LL")
+        parser.reset()
+        stream.seek(start)
+        parser.addErrorListener(self.errors)
+        parser._errHandler = DefaultErrorStrategy()
+        parser._interp.predictionMode = PredictionMode.LL
+        tree = getattr(parser, rule)()
+        self._result.parse_mode = PredictionMode.LL.name
+        return tree
+
+    def parse_methods(self, parser: JavaParser, stream: CommonTokenStream) \
+            -> List[Tuple[MethodSpan, JavaParser.MethodBodyContext]]:
+        """Parse the bodies of selected methods only.
+
+        Arguments:
+            parser: the parser, initialized with default settings.
+            stream: the token stream of the parser.
+
+        Returns:
+            The selected methods, and their body parse trees.
+        """
+        spans = [m for m in scan(stream) if m.matches(self.select)]
+        logger.debug(f'selected {len(spans)} methods')
+        bodies, modes = [], set()
+        for span in spans:
+            body = self.two_stage(parser, stream, 'methodBody', span.body)
+            modes.add(self._result.parse_mode)
+            bodies.append((span, body))
+        self._result.parse_mode = PredictionMode.LL.name \
+            if PredictionMode.LL.name in modes else \
+            next(iter(modes), None)
+        return bodies
+
     def analyze(self, t: Optional[Timeable] = None) -> JavaAnalyzer:
         """Performs analysis on the input file.
         This requires parse has already been performed.
@@ -87,14 +198,48 @@ class JavaAnalyzer(AbstractAnalyzer):
         Returns:
             The analyzer.
         """
-        assert self.tree
+        assert self.tree or self.bodies is not None
         t.start() if t else None
-        self.analysis_result = ClassVisitor().visit(self.tree).result
+        visitor = ClassVisitor(cache=self.cache)
+        if self.bodies is None:
+            self.analysis_result = visitor.visit(self.tree).result
+        else:
+            self.analysis_result = result = AnalysisResult()
+            for span, body in self.bodies:
+                if span.cls not in result:
+                    result[span.cls] = ClassResult(span.cls, {})
+                stream = body.parser.getTokenStream()
+                source = stream.getText(span.start, span.stop)
+                result[span.cls][span.name] = visitor.method_result(
+                    span.full_name, source, body)
+        for method in [m for c in self.analysis_result.values()
+                       for m in c.values()]:
+            method.index()
         t.stop() if t else None
         logger.debug("Analysis phase completed")
         return self
 
 
+class SyntaxErrors(ErrorListener):
+    """Collects syntax errors, instead of printing them."""
+
+    def __init__(self):
+        super().__init__()
+        self.errors: List[Tuple[int, int, str]] = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column,
+                    msg, e):
+        logger.error(f'line {line}:{column} {msg}')
+        self.errors.append((line, column, msg))
+
+    def error(self) -> AnalysisError:
+        """The first syntax error."""
+        line, column, msg = self.errors[0]
+        more = len(self.errors) - 1
+        return AnalysisError('syntax', msg + (
+            f' (and {more} more)' if more else ''), line, column)
+
+
 class ExtVisitor(BaseVisitor, JavaParserVisitor):
     """Shared basic behavior for all Java visitors."""
 
@@ -186,18 +331,67 @@ class ExtVisitor(BaseVisitor, JavaParserVisitor):
                 ExtVisitor.last(ctx, 3) == '(')
 
 
+class MethodTokens:
+    """Normalized token sequence of a method body.
+
+    Hidden tokens (whitespace, comments) are dropped, and every
+    identifier is replaced by a placeholder, in order of first
+    occurrence. Two method bodies with the same normalized tokens
+    are analyzed identically, up to renaming of identifiers.
+    """
+
+    # identifiers that the analysis treats specially
+    KEEP = {'equals'}
+
+    def __init__(self, body: JavaParser.MethodBodyContext):
+        """Tokenize a method body.
+
+        Arguments:
+            body: method body parse-tree node.
+        """
+        stream = body.parser.getTokenStream()
+        self.tokens = [t for t in stream.getTokens(
+            body.start.tokenIndex, body.stop.tokenIndex + 1)
+                       if t.channel == Token.DEFAULT_CHANNEL]
+        self.pos = {t.tokenIndex: n for n, t in enumerate(self.tokens)}
+        self.names: List[str] = []
+        ids, norm = {}, []
+        for t in self.tokens:
+            if t.type == JavaLexer.IDENTIFIER and t.text not in self.KEEP:
+                if t.text not in ids:
+                    ids[t.text] = len(self.names)
+                    self.names.append(t.text)
+                norm.append(f'#{ids[t.text]}')
+            else:
+                norm.append(t.text)
+        self.key = hashlib.sha256('\0'.join(
+            [JavaAnalyzer.version()] + norm).encode()).hexdigest()
+
+    def span(self, start: Token, stop: Token) -> Tuple[int, int]:
+        """Position of a token range in the normalized sequence."""
+        return self.pos[start.tokenIndex], self.pos[stop.tokenIndex]
+
+    def text(self, start: int, stop: int) -> str:
+        """Original text of a range in the normalized sequence."""
+        fst, lst = self.tokens[start], self.tokens[stop]
+        return fst.getInputStream().getText(fst.start, lst.stop)
+
+
 class ClassVisitor(ExtVisitor):
 
-    def __init__(self, parent: ClassVisitor = None):
+    def __init__(self, parent: ClassVisitor = None,
+                 cache: MethodCache = None):
         """Top-level parse-tree visitor that visits each
         class, including nested and siblings, and methods.
 
         Arguments:
             parent: parent ClassVisitor, if any.
+            cache: method cache (inherited from parent).
         """
         self.parent: ClassVisitor = parent
         self.result: AnalysisResult = AnalysisResult()
         self.name: str = ''
+        self.cache = parent.cache if parent else cache
 
     def hierarchy(self, name: str) -> str:
         """Construct hierarchical name, traversing
@@ -269,26 +463,130 @@ class ClassVisitor(ExtVisitor):
         self.name = ctx.identifier().getText()
         h, c = self.hierarchy(self.name), self.og_text(ctx)
         logger.debug(f'method: {self.name}')
-        mth = RecVisitor().visit(ctx.methodBody())
-        f, v, r, s = mth.flows, mth.vars, mth.ret_v, mth.skips
-        self.record(MethodResult(h, c, f, v, s, r))
+        self.record(self.method_result(h, c, ctx.methodBody()))
+
+    def method_result(self, name: str, source: str,
+                      body: JavaParser.MethodBodyContext) -> MethodResult:
+        """Analyze a method body.
+
+        Arguments:
+            name: full method name.
+            source: method source code.
+            body: method body parse-tree node.
+
+        Raises:
+            AnalysisError: if the analysis of the method fails,
+              at the position of the method.
+
+        Returns:
+            The method result, with its analysis time.
+        """
+        start = time.perf_counter_ns()
+        try:
+            if self.cache is None:
+                mth = RecVisitor().visit(body)
+                f, v, r, s = mth.flows, mth.variables, mth.returns, \
+                    mth.skips
+                method = MethodResult(name, source, f, v, s, r,
+                                      mth.interface)
+            else:
+                method = self.memoized(name, source, body)
+        except Exception as e:
+            raise AnalysisError(
+                'analysis', f'{name}: {type(e).__name__}: {e}',
+                body.start.line, body.start.column) from e
+        return method.timed('analysis', start)
+
+    def memoized(self, name: str, source: str,
+                 body: JavaParser.MethodBodyContext) -> MethodResult:
+        """Analyze a method body, reusing a cached result of an
+        equivalent method body, if one exists.
+
+        Arguments:
+            name: full method name.
+            source: method source code.
+            body: method body parse-tree node.
+
+        Returns:
+            The method result.
+        """
+        toks = MethodTokens(body)
+        enc = (lambda n: MethodCache.encode(n, toks.names))
+        dec = (lambda n: MethodCache.decode(n, toks.names))
+        if (entry := self.cache.get(toks.key)) is not None:
+            logger.debug(f'reusing cached method: {name}')
+            method = MethodResult(
+                name, source, [tuple(map(dec, f)) for f in entry['flows']],
+                set(map(dec, entry['vars'])),
+                [toks.text(*sp) for sp in entry['skips']],
+                set(map(dec, entry['return'])),
+                None if (ifc := entry.get('interface')) is None
+                else set(map(dec, ifc)))
+        else:
+            mth = RecVisitor().visit(body)
+            f, v, r, s = mth.flows, mth.variables, mth.returns, mth.skips
+            method = MethodResult(name, source, f, v, s, r, mth.interface)
+            try:
+                entry = {'flows': [list(map(enc, f)) for f in method.flows],
+                         'vars': list(map(enc, method.ids)),
+                         'return': list(map(enc, method.returns)),
+                         'interface': list(map(enc, method.interface)),
+                         'skips': [toks.span(*sp) for sp in mth.spans]}
+            except (ValueError, KeyError):
+                logger.debug(f'method not cacheable: {name}')
+                return method
+        method.digest, method.names, method.memo = \
+            toks.key, toks.names, entry
+        self.cache.restore(method, entry)
+        return method
 
 
 class RecVisitor(ExtVisitor):
 
-    def __init__(self):
-        """A recursive analyzer for method body and its commands."""
-        self.vars: set[str] = set()  # all encountered variables
-        self.out_v: set[str] = set()  # encountered out-variables
-        self.new_v: set[str] = set()  # encountered declarations
-        self.ret_v: set[str] = set()  # returned variables
-        self.matrix: FLOW_T = []  # data flows (in, out)
+    def __init__(self, names: Optional[NameTable] = None):
+        """A recursive analyzer for method body and its commands.
+
+        Variables are tracked by interned ID; visitors of the
+        same method share one name table.
+
+        Arguments:
+            names: name table of the method; if None, a new table.
+        """
+        self.names = NameTable() if names is None else names
+        self.vars: set[VAR_T] = set()  # all encountered variables
+        self.out_v: set[VAR_T] = set()  # encountered out-variables
+        self.new_v: set[VAR_T] = set()  # encountered declarations
+        self.ret_v: set[VAR_T] = set()  # returned variables
+        self.matrix = FlowMatrix()  # data flows (in, out)
+        self.alias: dict[VAR_T, VAR_T] = {}  # pending renames
         self.skips: List[str] = []  # omitted statements
+        self.spans: List[Tuple[Token, Token]] = []  # tokens of skips
 
     @property
     def flows(self) -> FLOW_T:
-        """Unique flow pairs."""
-        return list(set(self.matrix))
+        """Unique flow pairs, by variable name."""
+        name = self.names.name
+        return [(name(i), name(o)) for i, o in self.matrix]
+
+    @property
+    def variables(self) -> set[str]:
+        """Names of all encountered variables."""
+        return self.names.names_of(self.vars)
+
+    @property
+    def returns(self) -> set[str]:
+        """Names of returned variables."""
+        return self.names.names_of(self.ret_v)
+
+    @property
+    def interface(self) -> set[str]:
+        """Names of variables visible outside the method: those
+        not declared in it (parameters, fields), and returns."""
+        return self.names.names_of((self.vars - self.new_v) | self.ret_v)
+
+    def child(self) -> RecVisitor:
+        """A visitor for a nested scope of the same method."""
+        return RecVisitor(self.names)
 
     def skipped(self, ctx: JavaParser.compilationUnit,
                 desc: str = "") -> None:
@@ -300,60 +598,40 @@ class RecVisitor(ExtVisitor):
         """
         super().skipped(ctx, desc)
         self.skips += [BaseVisitor.og_text(ctx)]
+        self.spans += [(ctx.start, ctx.stop)]
 
-    def subst(self, old_: str, new_: str) -> None:
-        """Substitutes variable name in place.
+    def subst(self, old_: VAR_T, new_: VAR_T) -> None:
+        """Substitutes a variable.
+
+        The substitution is recorded, and applied when this
+        visitor is merged into its parent scope.
 
         Arguments:
-            old_: current name
-            new_: the name after substitution.
+            old_: current variable
+            new_: the variable after substitution.
         """
-        # flake8: noqa: E731
-        rename = lambda col: [new_ if v == old_ else v for v in col]
-        self.matrix = [tuple(rename(pair)) for pair in self.matrix]
-        self.vars = set(rename(self.vars))
-        self.out_v = set(rename(self.out_v))
-        self.new_v = set(rename(self.new_v))
-        self.ret_v = set(rename(self.ret_v))
+        self.alias[old_] = new_
 
     @staticmethod
-    def merge(target: set[str], *args: set[str]) -> None:
+    def merge(target: set, *args: set) -> None:
         """Combines two or more set; operationally this is a
         set-union, but target is modified in place."""
         [target.update(m) for m in args]
 
-    @staticmethod
-    def occurs(exp: JavaParser.ExpressionContext) -> set[str]:
+    def occurs(self, exp: JavaParser.ExpressionContext) -> set[VAR_T]:
         """Find all identifiers occurring in an expression."""
-        return IdVisitor().visit(exp).vars
+        return self.names.intern_all(IdVisitor().visit(exp).flat)
 
-    @staticmethod
-    def compose(m1: FLOW_T, *args: FLOW_T) -> FLOW_T:
-        """Compose two or more matrices. Internally, since
-        matrix is a list, this is just list addition.
-
-        Arguments:
-            m1: matrix of data flows
-            args: additional matrices
+    def assign(self, in_v: set[VAR_T], out_v: set[VAR_T]) -> None:
+        """Add data-flow pairs of an assignment."""
+        self.matrix.add(in_v, out_v)
 
-        Returns:
-            Composed matrix.
-        """
-        return reduce(operator.add, args, m1)
-
-    @staticmethod
-    def assign(in_v: set[str], out_v: set[str]) -> FLOW_T:
-        """Generate data-flow pairs from an assignment."""
-        return list(filter(
-            lambda x: x[0] != x[1], product(in_v, out_v)))
-
-    @staticmethod
-    def correction(occ: set[str], out: set[str]) -> FLOW_T:
-        """Get correction data-flows."""
-        return RecVisitor.assign(occ, out)
+    def correction(self, occ: set[VAR_T], out: set[VAR_T]) -> None:
+        """Add correction data-flows."""
+        self.matrix.add(occ, out)
 
     def lvars(self, ctx: JavaParser.ExpressionContext) \
-            -> Tuple[set[str], set[str]]:
+            -> Tuple[set[VAR_T], set[VAR_T]]:
         """Find variables in an expression, with added knowledge that
         expression occurs on left-side of assignment -or- in isolation.
 
@@ -368,8 +646,8 @@ class RecVisitor(ExtVisitor):
 
         elif cc == 1:  # terminal identifier
             if ctx.getChild(0).getChildCount() == 0:
-                out_v = RecVisitor.occurs(ctx)
-                logger.debug(f'L/out: {", ".join(out_v)}')
+                out_v = self.occurs(ctx)
+                logger.debug(f'L/out: {self.names.fmt(out_v)}')
                 return set(), out_v
             else:
                 return self.lvars(ctx.getChild(0))
@@ -384,10 +662,10 @@ class RecVisitor(ExtVisitor):
         elif cc >= 4 and RecVisitor.is_array_exp(ctx):  # arrays
             all_vars = IdVisitor().visit(ctx)
             # the left-most is out, rest are in
-            fst = all_vars.flat.pop(0)
-            rest = all_vars.vars
-            logger.debug(f'L/out: {fst}')
-            logger.debug(f'L/in:  {", ".join(rest)}')
+            fst = self.names.intern(all_vars.flat.pop(0))
+            rest = self.names.intern_all(all_vars.flat)
+            logger.debug(f'L/out: {self.names.name(fst)}')
+            logger.debug(f'L/in:  {self.names.fmt(rest)}')
             return rest, {fst}
 
         # otherwise skip
@@ -395,7 +673,7 @@ class RecVisitor(ExtVisitor):
         return set(), set()
 
     def rvars(self, ctx: JavaParser.ExpressionContext) \
-            -> Tuple[set[str], set[str]]:
+            -> Tuple[set[VAR_T], set[VAR_T]]:
         """Find variables in an expression, with added knowledge that
         expression occurs on right-side of assignment.
 
@@ -415,8 +693,8 @@ class RecVisitor(ExtVisitor):
             return set(), set()
 
         def default_handler():
-            if in_v := RecVisitor.occurs(ctx):
-                logger.debug(f'R/in:  {", ".join(in_v)}')
+            if in_v := self.occurs(ctx):
+                logger.debug(f'R/in:  {self.names.fmt(in_v)}')
             return in_v, set()
 
         def rec_children(cl):
@@ -444,7 +722,7 @@ class RecVisitor(ExtVisitor):
                 elif self.is_app(c2):
                     return self.new_ref(c2)
                 # if above pattern matches fail
-                return skip(f'new')
+                return skip('new')
             # unary op
             if c1t in self.U_OP or c2t in self.U_OP:
                 id_node = c1 if c1t not in self.U_OP else c2
@@ -479,13 +757,13 @@ class RecVisitor(ExtVisitor):
         # switch expression (cc ≥7)
         # this is a scoped and can create in and out flows.
         elif ctx.getChild(0).getText() == "switch":
-            return skip(f'switch-exp')
+            return skip('switch-exp')
 
         # something else
         return skip(f'rvars-{cc}')
 
     def new_ref(self, ctx: JavaParser.ExpressionContext) \
-            -> Tuple[set[str], set[str]]:
+            -> Tuple[set[VAR_T], set[VAR_T]]:
         """Finds variables in a new object constructor call.
 
         Arguments:
@@ -501,8 +779,9 @@ class RecVisitor(ExtVisitor):
             self.skipped(ctx, 'new obj')
             return set(), set()
 
-        # params flow through a unique object reference
-        ref = self.uniq_name(list(ref)[0], self.vars, 0)
+        # params flow through an object reference, unique in
+        # scope; allocations in sibling scopes share the name
+        ref = self.names.unused(list(ref)[0], self.vars)
         params = self.flatten(ctx.getChild(1)).getChild(1)
         o_in = set(reduce(set.union, [
             self.rvars(p)[0] for p in map(
@@ -510,13 +789,13 @@ class RecVisitor(ExtVisitor):
                 range(0, params.getChildCount(), 2))], set()))
         # merge constructor flows and variables
         if o_in:
-            flows = self.assign(o_in, {ref})
+            self.assign(o_in, {ref})
             self.merge(self.vars, o_in)
-            self.matrix = self.compose(self.matrix, flows)
-            logger.debug(f'R/obj: {", ".join(o_in)} → {ref}')
+            logger.debug(f'R/obj: {self.names.fmt(o_in)} → '
+                         f'{self.names.name(ref)}')
         return {ref}, set()
 
-    def bx_vars(self, ctx: JavaParser.ExpressionContext) -> set[str]:
+    def bx_vars(self, ctx: JavaParser.ExpressionContext) -> set[VAR_T]:
         """Find variables in an expression where expression
         evaluates to a boolean.
 
@@ -533,7 +812,7 @@ class RecVisitor(ExtVisitor):
                     and rc.getChildCount() == 2
                     and rc.getChild(0).getText() == 'equals'):
                 return self.bx_vars(lc) | self.bx_vars(rc.getChild(1))
-        return RecVisitor.occurs(ctx)
+        return self.occurs(ctx)
 
     def visitMethodCall(self, ctx: JavaParser.MethodCallContext):
         self.skipped(ctx, 'call')
@@ -550,8 +829,7 @@ class RecVisitor(ExtVisitor):
                 in_v, _ = self.rvars(ctx.getChild(2))
                 self.merge(self.vars, in_v)
                 self.merge(self.out_v, out_v)
-                flows = self.assign(in_v, out_v)
-                self.matrix = self.compose(self.matrix, flows)
+                self.assign(in_v, out_v)
             return
         # fall-through
         self.skipped(ctx, 'decl')
@@ -614,10 +892,7 @@ class RecVisitor(ExtVisitor):
                 in_r, _ = self.rvars(rc)
                 self.merge(self.vars, in_l, in_r, out_l)
                 self.merge(self.out_v, out_l)
-                flows = self.compose(
-                    self.assign(in_r, out_l),
-                    self.assign(in_l, out_l))
-                self.matrix = self.compose(self.matrix, flows)
+                self.assign(in_r | in_l, out_l)
                 return
 
             if op == ".":
@@ -631,8 +906,7 @@ class RecVisitor(ExtVisitor):
                 in_l, out_l = self.lvars(ctx)
                 self.merge(self.vars, out_l, in_l)
                 self.merge(self.out_v, out_l)
-                self.matrix = self.compose(
-                    self.matrix, self.assign(in_l, out_l))
+                self.assign(in_l, out_l)
                 return
 
         # method call => fall-through
@@ -653,13 +927,13 @@ class RecVisitor(ExtVisitor):
             return
         # TODO: do not break up a dot expression
         #   followed by method call
-        r_vars = RecVisitor.occurs(ctx.getChild(1))
+        r_vars = self.occurs(ctx.getChild(1))
         if "." in ctx.getChild(1).getText():
-            print(r_vars)
+            print(self.names.names_of(r_vars))
             self.skipped(ctx.getChild(1), 'return dot-exp')
             return
         # TODO: maybe need a fresh var?
-        logger.debug(f'return: {r_vars}')
+        logger.debug(f'return: {self.names.names_of(r_vars)}')
         RecVisitor.merge(self.ret_v, r_vars)
 
     def visitSwitchExpression(
@@ -674,18 +948,20 @@ class RecVisitor(ExtVisitor):
     def scoped_merge(self, child: RecVisitor):
         """Controlled merge when child has local scope."""
         # ensure variables in child scope are unique wrt. parent
-        if dup := list(self.vars & child.new_v):
-            for d_old in dup:
-                d_new = self.uniq_name(d_old, self.vars)
-                child.subst(d_old, d_new)
-        # now safely merge scopes
-        assert not self.vars & child.new_v
-        self.merge(self.vars, child.vars)
-        self.merge(self.out_v, child.out_v)
-        self.merge(self.new_v, child.new_v)
-        self.merge(self.ret_v, child.ret_v)
-        self.matrix = self.compose(self.matrix, child.matrix)
+        for d_old in sorted(self.vars & child.new_v):
+            child.subst(d_old, self.names.fresh(d_old))
+        # now safely merge scopes, renaming in one pass
+        ren = (lambda v: child.alias.get(v, v))
+        new_v = set(map(ren, child.new_v))
+        assert not self.vars & new_v
+        self.merge(self.vars, map(ren, child.vars))
+        self.merge(self.out_v, map(ren, child.out_v))
+        self.merge(self.new_v, new_v)
+        self.merge(self.ret_v, map(ren, child.ret_v))
+        self.matrix |= child.matrix.renamed(child.alias) \
+            if child.alias else child.matrix
         self.skips += child.skips
+        self.spans += child.spans
         return self
 
     def corr_stmt(
@@ -696,10 +972,9 @@ class RecVisitor(ExtVisitor):
     ) -> RecVisitor:
         """Analyze body stmt and apply correction."""
         e_vars = self.bx_vars(exp)
-        stmt = visited or RecVisitor().visit(body)
+        stmt = visited or self.child().visit(body)
         RecVisitor.merge(stmt.vars, e_vars)
-        corr = RecVisitor.correction(e_vars, stmt.out_v)
-        stmt.matrix = RecVisitor.compose(stmt.matrix, corr)
+        stmt.correction(e_vars, stmt.out_v)
         return stmt
 
     def __if(self, ctx: JavaParser.StatementContext):
@@ -711,12 +986,12 @@ class RecVisitor(ExtVisitor):
         self.scoped_merge(fst_branch)
 
     def __switch(self, ctx: Union[
-        JavaParser.StatementContext |
-        JavaParser.SwitchExpressionContext]):
-        switch_ctx, switch_var = RecVisitor(), ctx.getChild(1)
+            JavaParser.StatementContext |
+            JavaParser.SwitchExpressionContext]):
+        switch_ctx, switch_var = self.child(), ctx.getChild(1)
         # iterate cases
         for cn in range(3, ctx.getChildCount() - 1):
-            case = RecVisitor()
+            case = switch_ctx.child()
             for body_st in ctx.getChild(cn).children:
                 case.visit(body_st)
             switch_ctx.scoped_merge(case)
@@ -730,7 +1005,7 @@ class RecVisitor(ExtVisitor):
         # loop with 3-part control expression
         if for_ctrl.getChildCount() > 4:
             init, cond, updt = [for_ctrl.getChild(i) for i in [0, 2, 4]]
-            stmt = RecVisitor().visit(init).visit(updt).visit(body)
+            stmt = self.child().visit(init).visit(updt).visit(body)
             stmt = self.corr_stmt(cond, visited=stmt)
             self.scoped_merge(stmt)
             return
@@ -744,8 +1019,7 @@ class RecVisitor(ExtVisitor):
             lc, rc = [self.occurs(x) for x in [iter_, src]]
             self.merge(stmt.vars, lc, rc)
             self.merge(stmt.new_v, lc)
-            stmt.matrix = RecVisitor.compose(
-                stmt.matrix, self.assign(rc, lc))
+            stmt.assign(rc, lc)
             self.scoped_merge(stmt)
             return
 
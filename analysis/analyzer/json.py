@@ -18,12 +18,14 @@ class JsonLoader(AbstractAnalyzer):
         """Accepts any file with .json extension."""
         return input_file.endswith('.json')
 
-    def parse(self, t: Optional[Timeable] = None) -> JsonLoader:
+    def parse(self, t: Optional[Timeable] = None,
+              lex: Optional[Timeable] = None) -> JsonLoader:
         """Attempt to parse the input file."""
         logger.debug(f'parsing {self.input_file}')
         with open(self.input_file) as fl:
             self._result.reconstruct(json.load(fl))
         t.start().stop() if t else None
+        lex.start().stop() if lex else None
         logger.debug("parsed successfully")
         return self
 
@@ -0,0 +1,176 @@
+"""Token-level pre-scan of Java sources.
+
+Finds the classes and methods of a Java file from its token
+stream, without parsing, by matching braces and parentheses.
+This lets the analyzer parse only the bodies of selected
+methods.
+
+The scan recognizes the methods that the analyzer records, and
+names them the same way, e.g. `Outer.Inner.method`: methods of
+classes, including nested classes; methods of enums, records,
+and anonymous classes outside methods, which belong to the
+enclosing class. Method bodies, and bodies of interfaces and
+annotation types (except nested classes) are opaque.
+"""
+
+from __future__ import annotations
+
+import logging
+from fnmatch import fnmatchcase
+from typing import List, NamedTuple, Optional
+
+from antlr4 import CommonTokenStream, Token
+
+from analysis.parser import JavaLexer
+
+logger = logging.getLogger(__name__)
+
+L = JavaLexer
+NAMES = {L.IDENTIFIER, *range(L.MODULE, L.PERMITS + 1)} - {L.VAR}
+"""Token types that can be identifiers (contextual keywords)."""
+PRIMITIVES = {L.BOOLEAN, L.BYTE, L.CHAR, L.DOUBLE, L.FLOAT, L.INT,
+              L.LONG, L.SHORT, L.VOID}
+TYPE_END = NAMES | PRIMITIVES | {L.GT, L.RBRACK}
+"""Token types that end the return type of a method."""
+OPAQUE = {L.INTERFACE, L.ENUM, L.RECORD}
+MODIFIERS = {L.ABSTRACT, L.DEFAULT, L.FINAL, L.NATIVE, L.PRIVATE,
+             L.PROTECTED, L.PUBLIC, L.STATIC, L.STRICTFP, L.SYNCHRONIZED,
+             L.TRANSIENT, L.VOLATILE, L.SEALED, L.NON_SEALED,
+             L.SEMI, L.LBRACE, L.RBRACE, L.GT, L.RPAREN}
+"""Token types that can precede a method declaration."""
+METHODS = {'class', 'members'}
+"""Kinds of bodies where methods are declared."""
+MEMBERS = METHODS | {'types'}
+"""Kinds of bodies where classes are declared."""
+
+
+class MethodSpan(NamedTuple):
+    """Position of a method in the token stream."""
+    cls: str  # full class name
+    name: str  # method name
+    start: int  # token index of the declaration (return type)
+    body: int  # token index of the body: '{', or ';' if abstract
+    stop: int  # token index of the end of the body
+
+    @property
+    def full_name(self) -> str:
+        return f'{self.cls}.{self.name}'
+
+    def matches(self, patterns: List[str]) -> bool:
+        """True if method full name matches a glob pattern."""
+        return any(fnmatchcase(self.full_name, p) for p in patterns)
+
+
+def scan(stream: CommonTokenStream) -> List[MethodSpan]:
+    """Find methods of classes in a token stream.
+
+    Arguments:
+        stream: token stream of a Java file.
+
+    Returns:
+        The methods, in source order.
+    """
+    stream.fill()
+    toks = [t for t in stream.tokens if t.channel == Token.DEFAULT_CHANNEL
+            and t.type != Token.EOF]
+    found: List[MethodSpan] = []
+    # open braces, as (kind, class name or method); kinds:
+    # class: class body; members: body whose methods belong to the
+    # enclosing class; types: body with only nested classes;
+    # method: method body; block: anything else
+    frames: List[tuple] = []
+    pending: Optional[tuple] = None  # declaration awaiting its '{'
+    classes = (lambda: [f[1] for f in frames if f[0] == 'class'])
+    i = 0
+    while i < len(toks):
+        tt = toks[i].type
+        prev = toks[i - 1].type if i else None
+        top = frames[-1][0] if frames else 'types'
+        if tt in (L.CLASS, *OPAQUE) and prev not in (L.DOT, L.AT) \
+                and i + 1 < len(toks) and toks[i + 1].type in NAMES \
+                and pending is None and top in MEMBERS:
+            pending = ('class', toks[i + 1].text) if tt == L.CLASS \
+                else ('types', None) if tt == L.INTERFACE \
+                else ('members', None)
+            i += 2
+            continue
+        if tt == L.INTERFACE and prev == L.AT:  # annotation type
+            pending = ('types', None)
+        elif tt == L.LPAREN and top in METHODS and pending is None:
+            pending = __method(toks, i, '.'.join(classes()))
+            if pending is not None:
+                i = pending[2]  # the body
+                continue
+        if tt == L.LBRACE:
+            # anonymous classes and initializer blocks: their
+            # methods and classes belong to the enclosing class
+            frames.append(pending or (
+                ('members', None) if top in METHODS and prev != L.ARROW
+                else ('block', None)))
+            pending = None
+        elif tt == L.RBRACE and frames:
+            kind, what, *rest = frames.pop()
+            if kind == 'method':
+                found.append(MethodSpan(*what, stop=toks[i].tokenIndex))
+        elif tt == L.SEMI and pending and pending[0] == 'method':
+            found.append(MethodSpan(*pending[1], stop=toks[i].tokenIndex))
+            pending = None
+        elif tt == L.SEMI and top in MEMBERS:
+            pending = None
+        i += 1
+    return found
+
+
+def __method(toks: List[Token], lp: int, cls: str) -> Optional[tuple]:
+    """Match a method declaration, from the '(' of its parameters.
+
+    Returns:
+        A method frame, with the position of the body ('{' or ';')
+        in toks, or None if this is not a method declaration.
+    """
+    if lp < 2 or toks[lp - 1].type not in NAMES \
+            or toks[lp - 2].type not in TYPE_END:
+        return None
+    start = __type_start(toks, lp - 2)
+    if toks[start].type not in NAMES | PRIMITIVES or start < 1:
+        return None
+    before = toks[start - 1].type
+    if not (before in MODIFIERS or before in NAMES and start > 1
+            and toks[start - 2].type in (L.AT, L.DOT)):
+        return None  # not after modifiers, type parameters, etc.
+    depth, j = 0, lp
+    while j < len(toks):  # matching ')'
+        depth += (toks[j].type == L.LPAREN) - (toks[j].type == L.RPAREN)
+        if depth == 0:
+            break
+        j += 1
+    j += 1
+    while j < len(toks) and toks[j].type in (L.LBRACK, L.RBRACK):
+        j += 1
+    if j < len(toks) and toks[j].type == L.THROWS:
+        while j < len(toks) and toks[j].type not in (L.LBRACE, L.SEMI):
+            j += 1
+    if j >= len(toks) or toks[j].type not in (L.LBRACE, L.SEMI):
+        return None
+    return ('method', (cls, toks[lp - 1].text, toks[start].tokenIndex,
+                       toks[j].tokenIndex), j)
+
+
+def __type_start(toks: List[Token], j: int) -> int:
+    """Position of the first token of a type, from its last token."""
+    while j > 0:
+        while j > 1 and toks[j].type == L.RBRACK:
+            j -= 2  # '[' ']'
+        if toks[j].type == L.GT:
+            depth = 0
+            while j > 0:
+                depth += (toks[j].type == L.GT) - (toks[j].type == L.LT)
+                j -= 1
+                if depth == 0:
+                    break
+        start = j
+        if j > 1 and toks[j - 1].type == L.DOT:
+            j -= 2
+            continue
+        return start
+    return j
@@ -0,0 +1,273 @@
+"""Decision profiling of the Java parser.
+
+ANTLR parsers choose between alternatives of the grammar by
+adaptive prediction, at numbered decision points. Prediction
+is cheap when the lookahead DFA already covers the input, and
+expensive when it has to simulate the ATN, look far ahead, or
+fall back to full-context (LL) prediction. A few decisions
+usually dominate the parse time.
+
+The Python runtime has no profiling ATN simulator, so this
+module provides one: ProfilingATNSimulator measures, for every
+decision, the time spent predicting, the lookahead depth, the
+ATN simulations (DFA misses), the full-context fallbacks, and
+the ambiguities and context sensitivities it detects.
+
+```python
+profile = GrammarProfile()
+for fn in files:
+    profile.parse(fn)
+print(profile.report())
+```
+
+Files are parsed in LL prediction mode, as by the profiler of
+the Java runtime: every decision is first predicted with SLL, and
+falls back to full-context prediction on an SLL conflict. In SLL
+mode, as in the first stage of JavaAnalyzer, there are no such
+fallbacks, and ambiguities go unreported. The number of files
+that needed any full-context prediction is recorded.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Dict, List, Optional
+
+from antlr4 import CommonTokenStream, FileStream, Parser, PredictionMode
+from antlr4.atn.ParserATNSimulator import ParserATNSimulator
+
+from analysis import Result
+from analysis.parser import JavaLexer, JavaParser
+from .java import JavaAnalyzer
+
+logger = logging.getLogger(__name__)
+
+
+class DecisionInfo(dict):
+    """Profile of one parser decision."""
+
+    FIELDS = ('invocations', 'time_ns', 'sll_lookahead', 'sll_max_look',
+              'atn_transitions', 'll_fallbacks', 'll_lookahead',
+              'll_max_look', 'ambiguities', 'context_sensitivities')
+
+    def __init__(self, decision: int, rule: str):
+        """Initialize a decision profile.
+
+        Arguments:
+            decision: decision number.
+            rule: name of the grammar rule of the decision.
+        """
+        super().__init__(decision=decision, rule=rule,
+                         **dict.fromkeys(self.FIELDS, 0))
+
+    def add(self, key: str, n: int = 1):
+        self[key] += n
+
+    def look(self, key: str, depth: int):
+        """Record the lookahead depth of a prediction."""
+        self[f'{key}_lookahead'] += depth
+        self[f'{key}_max_look'] = max(self[f'{key}_max_look'], depth)
+
+
+class ProfilingATNSimulator(ParserATNSimulator):
+    """Parser ATN simulator that profiles every decision.
+
+    Follows the profiling simulator of the Java runtime: the
+    lookahead of a prediction extends to the last token that
+    the DFA or ATN simulation examined, in SLL and in LL.
+    """
+
+    def __init__(self, parser: Parser,
+                 decisions: Optional[List[DecisionInfo]] = None):
+        """Initialize the simulator, and install it in a parser.
+
+        Arguments:
+            parser: a generated parser.
+            decisions: profiles to accumulate into, e.g., over
+              many parsers; by default, new empty profiles.
+        """
+        super().__init__(parser, parser.atn, parser.decisionsToDFA,
+                         parser.sharedContextCache)
+        names = parser.ruleNames
+        self.decisions = decisions or [
+            DecisionInfo(d, names[s.ruleIndex])
+            for d, s in enumerate(parser.atn.decisionToState)]
+        self._info: Optional[DecisionInfo] = None
+        self._sll_stop = self._ll_stop = -1
+        parser._interp = self
+
+    def adaptivePredict(self, input, decision, outerContext):
+        self._info = info = self.decisions[decision]
+        self._sll_stop = self._ll_stop = -1
+        start, t0 = input.index, time.perf_counter_ns()
+        try:
+            return super().adaptivePredict(input, decision, outerContext)
+        finally:
+            info.add('time_ns', time.perf_counter_ns() - t0)
+            info.add('invocations')
+            info.look('sll', self._sll_stop - start + 1)
+            if self._ll_stop >= 0:
+                info.look('ll', self._ll_stop - start + 1)
+
+    def getExistingTargetState(self, previousD, t):
+        self._sll_stop = self._input.index
+        return super().getExistingTargetState(previousD, t)
+
+    def computeTargetState(self, dfa, previousD, t):
+        self._info.add('atn_transitions')
+        return super().computeTargetState(dfa, previousD, t)
+
+    def computeReachSet(self, closure, t, fullCtx):
+        if fullCtx:
+            self._ll_stop = self._input.index
+        return super().computeReachSet(closure, t, fullCtx)
+
+    def reportAttemptingFullContext(self, dfa, conflictingAlts, configs,
+                                    startIndex, stopIndex):
+        self._info.add('ll_fallbacks')
+        super().reportAttemptingFullContext(
+            dfa, conflictingAlts, configs, startIndex, stopIndex)
+
+    def reportContextSensitivity(self, dfa, prediction, configs,
+                                 startIndex, stopIndex):
+        self._info.add('context_sensitivities')
+        super().reportContextSensitivity(
+            dfa, prediction, configs, startIndex, stopIndex)
+
+    def reportAmbiguity(self, dfa, D, startIndex, stopIndex, exact,
+                        ambigAlts, configs):
+        self._info.add('ambiguities')
+        super().reportAmbiguity(dfa, D, startIndex, stopIndex, exact,
+                                ambigAlts, configs)
+
+
+class GrammarProfile:
+    """Decision profile of the Java parser, over many files."""
+
+    def __init__(self):
+        self.decisions: Optional[List[DecisionInfo]] = None
+        self.files: Dict[str, Optional[str]] = {}  # prediction mode
+        self.failed: Dict[str, dict] = {}
+        self.time_ns = 0
+
+    def parse(self, input_file: str) -> GrammarProfile:
+        """Parse a file, and accumulate its decision profile.
+
+        Arguments:
+            input_file: path to a Java file.
+
+        Returns:
+            The profile.
+        """
+        analyzer = JavaAnalyzer(Result(input_file))
+        lexer = JavaLexer(FileStream(input_file, encoding="UTF-8"))
+        lexer.removeErrorListeners()
+        lexer.addErrorListener(analyzer.errors)
+        stream = CommonTokenStream(lexer)
+        stream.fill()
+        parser = JavaParser(stream)
+        self.decisions = ProfilingATNSimulator(
+            parser, self.decisions).decisions
+        parser.removeErrorListeners()
+        parser.addErrorListener(analyzer.errors)
+        parser._interp.predictionMode = PredictionMode.LL
+        before = self.fallbacks
+        t0 = time.perf_counter_ns()
+        parser.compilationUnit()
+        self.time_ns += time.perf_counter_ns() - t0
+        self.files[input_file] = (PredictionMode.LL if self.fallbacks >
+                                  before else PredictionMode.SLL).name
+        if analyzer.errors.errors:
+            self.failed[input_file] = analyzer.errors.error().info
+        return self
+
+    @property
+    def fallbacks(self) -> int:
+        """Number of full-context (LL) predictions so far."""
+        return sum(d['ll_fallbacks'] for d in self.decisions or [])
+
+    @property
+    def ll_files(self) -> int:
+        """Number of files that needed full-context prediction."""
+        return sum(m == PredictionMode.LL.name
+                   for m in self.files.values())
+
+    def ranked(self) -> List[DecisionInfo]:
+        """Decisions that were used, most expensive first."""
+        return sorted((d for d in self.decisions or []
+                       if d['invocations']),
+                      key=lambda d: (-d['time_ns'], d['decision']))
+
+    def rules(self) -> List[dict]:
+        """Decision profiles summed by rule, most expensive first."""
+        rules: Dict[str, dict] = {}
+        for d in self.ranked():
+            acc = rules.setdefault(d['rule'], {
+                'rule': d['rule'], 'decisions': 0,
+                **dict.fromkeys(DecisionInfo.FIELDS, 0)})
+            acc['decisions'] += 1
+            for k in DecisionInfo.FIELDS:
+                acc[k] = max(acc[k], d[k]) if k.endswith('max_look') \
+                    else acc[k] + d[k]
+        return sorted(rules.values(), key=lambda r: -r['time_ns'])
+
+    def to_json(self) -> dict:
+        return {'files': len(self.files), 'll_files': self.ll_files,
+                'failed': self.failed, 'parse_ms': self.time_ns / 1e6,
+                'rules': self.rules(), 'decisions': self.ranked()}
+
+    def report(self, take: int = 25) -> str:
+        """Ranked report of the most expensive decisions.
+
+        Arguments:
+            take: number of decisions (and rules) to show.
+
+        Returns:
+            The report, as text.
+        """
+        total = max(1, sum(d['time_ns'] for d in self.ranked()))
+        head = (f'{"rule":<28}{"dec":>5}{"calls":>9}{"ms":>10}{"%":>6}'
+                f'{"look":>7}{"max":>6}{"atn":>7}{"LL":>6}{"LLmax":>6}'
+                f'{"amb":>5}{"ctx":>5}')
+
+        def row(d, dec):
+            return (f'{d["rule"][:27]:<28}{dec:>5}{d["invocations"]:>9}'
+                    f'{d["time_ns"] / 1e6:>10.1f}'
+                    f'{100 * d["time_ns"] / total:>6.1f}'
+                    f'{d["sll_lookahead"] / max(1, d["invocations"]):>7.2f}'
+                    f'{d["sll_max_look"]:>6}{d["atn_transitions"]:>7}'
+                    f'{d["ll_fallbacks"]:>6}{d["ll_max_look"]:>6}'
+                    f'{d["ambiguities"]:>5}{d["context_sensitivities"]:>5}')
+
+        failed = ''.join(f'\n  {fn}: {e["message"]}'
+                         for fn, e in self.failed.items())
+        return '\n'.join([
+            f'Files: {len(self.files)}, with full-context prediction: '
+            f'{self.ll_files}, failed: {len(self.failed)}{failed}',
+            f'Parse time: {self.time_ns / 1e9:.3f} sec, in prediction: '
+            f'{sum(d["time_ns"] for d in self.ranked()) / 1e9:.3f} sec',
+            '', f'DECISIONS (TOP {take})', head,
+            *(row(d, d['decision']) for d in self.ranked()[:take]),
+            '', f'RULES (TOP {take})', head,
+            *(row(r, r['decisions']) for r in self.rules()[:take])])
+
+
+def profile(files: List[str]) -> GrammarProfile:
+    """Profile parser decisions over Java files.
+
+    Arguments:
+        files: paths to Java files.
+
+    Returns:
+        The accumulated profile.
+    """
+    prof = GrammarProfile()
+    for fn in files:
+        logger.debug(f'profiling {fn}')
+        try:
+            prof.parse(fn)
+        except (OSError, UnicodeError) as e:
+            logger.error(f'Failed {fn}: {e}')
+            prof.failed[fn] = {'message': str(e)}
+    return prof
@@ -0,0 +1,124 @@
+"""Benchmark of evaluation engines.
+
+Analyzes all programs in the given directories once, then
+solves every method with each engine, and reports the mean
+time per method. The baseline engine solves as before Z3
+sessions, so that before and after are measured in the same
+run. Then checks policies on every method, with integer levels
+and with lattice levels, and reports the mean time per method
+again.
+
+```
+python3 -m analysis.bench programs [DIR …]
+```
+"""
+
+import contextlib
+import io
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import List, Callable
+
+# noinspection PyPackageRequirements
+from z3 import Ints, Solver
+
+from . import Result, MethodResult
+from .analyzer import AnalysisError, choose_analyzer
+from .evaluate import Evaluate, Z3Session
+from .lattice import Lattice
+
+
+def collect(dirs: List[str]) -> List[MethodResult]:
+    """Analyze programs, and collect methods to solve.
+    Files that fail to analyze are skipped."""
+    methods = []
+    for fn in sorted(str(p) for d in dirs for p in Path(d).rglob('*.java')):
+        result = Result(fn)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                choose_analyzer(fn)(result).parse().analyze()
+        except (AnalysisError, OSError, UnicodeError) as e:
+            print(f'skipped {fn}: {e}')
+            continue
+        methods += [m for c in result.analysis_result.values()
+                    for m in c.values() if m.ids]
+    return methods
+
+
+def baseline(method: MethodResult) -> None:
+    """Solve as Evaluate.solve did before Z3 sessions: a new
+    solver per method, and variables looked up by position."""
+    solver = Solver()
+    vrs = method.ids
+    s_vars = Ints(' '.join([f'l({v})' for v in vrs]))
+    [solver.add(v >= 0) for v in s_vars]
+    for (in_, out_) in method.flows:
+        solver.add(s_vars[vrs.index(in_)] <= s_vars[vrs.index(out_)])
+    method.smtlib = solver.sexpr()
+    method.sat = str(solver.check())
+    if method.sat.lower() == 'sat':
+        model = solver.model()
+        method.model = ', '.join(
+            f'{d.name()}={model[d].as_long()}' for d in model.decls())
+
+
+def timed(methods: List[MethodResult], solve: Callable, rounds: int) \
+        -> float:
+    """Mean time per method, in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for m in methods:
+            solve(MethodResult.init(m))
+    return (time.perf_counter() - start) * 1e3 / rounds / len(methods)
+
+
+def policies(method: MethodResult, top: int) -> List[dict]:
+    """Policies of a benchmark method: alternate the levels of
+    its variables between top and 0 (bottom), and fix only the
+    first, or only the last variable."""
+    vrs = sorted(method.ids)
+    levels = {v: (i % 2) * top for i, v in enumerate(vrs)}
+    return [levels, {vrs[0]: top}, {vrs[-1]: 0}]
+
+
+def main(dirs: List[str], rounds: int = 3) -> None:
+    logging.disable(logging.WARNING)  # skipped statements
+    methods = collect(dirs)
+    flows = sum(len(m.flows) for m in methods)
+    print(f'{len(methods)} methods, {flows} flows, {rounds} rounds')
+    session = Z3Session()
+    engines = {
+        'z3 (baseline)': baseline,
+        'z3 (solver per method)': Evaluate.solve,
+        'z3 (session)': lambda m: Evaluate.solve(m, session),
+        'native': Evaluate.solve_native}
+    for name, solve in engines.items():
+        print(f'{name:<24} {timed(methods, solve, rounds):>8.3f} ms/method')
+    print('policies (3 per method):')
+    two = Lattice(['low', 'high'], [['low', 'high']])
+    diamond = Lattice(['low', 'A', 'B', 'high'], [
+        ['low', 'A'], ['low', 'B'], ['A', 'high'], ['B', 'high']])
+    powerset = Lattice.powerset(list('ABCD'))
+    checks = {
+        'z3 Int': (None, 1, 'z3'),
+        'native Int': (None, 1, 'native'),
+        'z3 BV, 2 levels': (two, 1, 'z3'),
+        'native, 2 levels': (two, 1, 'native'),
+        'z3 BV, diamond': (diamond, 3, 'z3'),
+        'native, diamond': (diamond, 3, 'native'),
+        'z3 BV, 2^4 powerset': (powerset, 15, 'z3'),
+        'native, 2^4 powerset': (powerset, 15, 'native')}
+    for name, (lattice, top, solver) in checks.items():
+        def check(m: MethodResult) -> None:
+            if lattice and solver == 'z3':  # bitvectors, not native
+                session.check_policies(m, policies(m, top), lattice)
+            else:
+                Evaluate.check_policies(m, policies(m, top), session,
+                                        solver, lattice)
+        print(f'{name:<24} {timed(methods, check, rounds):>8.3f} ms/method')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or ['programs'])
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, List
+
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Persistent, content-addressed cache of analysis results.
+
+    A cache entry is keyed by a hash of the input file content,
+    and the configuration that produced the result (analyzer,
+    grammar and solver versions, analysis steps, etc.). Files
+    that have not changed since the last run are recognized by
+    modification time and size, without re-reading the file.
+
+    The cache directory is bounded in size. When it grows past
+    the limit, the least recently used entries are evicted. The
+    limit is shared by the result, method, and shape caches, and
+    the file stats of the fast path.
+
+    Example:
+
+    ```python
+    cache = ResultCache('out/.cache')
+    key = cache.key('Program.java', solver=Evaluate.info())
+    if not (data := cache.get(key)):
+        ...  # analyze, then
+        cache.put(key, result)
+    ```
+    """
+
+    ENTRIES, STATS = 'entries', 'stat'
+    MB = 1 << 20
+
+    def __init__(self, path: str, max_mb: float = 256):
+        """Initialize a result cache.
+
+        Arguments:
+            path: cache directory.
+            max_mb: cache size limit, in megabytes.
+        """
+        self.path = path
+        self.max_bytes = int(max_mb * self.MB)
+
+    def entry(self, key: str) -> str:
+        """Path of a cache entry."""
+        return os.path.join(self.path, self.ENTRIES, f'{key}.json')
+
+    def content_hash(self, in_file: str) -> str:
+        """Hash of file content.
+
+        If the file modification time and size match the
+        previous lookup, the previous hash is reused.
+
+        Arguments:
+            in_file: path to input file.
+
+        Returns:
+            The content hash.
+        """
+        st = os.stat(in_file)
+        real = os.path.realpath(in_file).encode()
+        stat_fn = os.path.join(self.path, self.STATS,
+                               hashlib.sha1(real).hexdigest())
+        fast = f'{st.st_mtime_ns} {st.st_size}'
+        if os.path.isfile(stat_fn):
+            with open(stat_fn) as fl:
+                known, _, digest = fl.read().rpartition(' ')
+            if known == fast:
+                os.utime(stat_fn)  # mark recently used
+                return digest
+        digest = utils.digest(in_file)
+        self.__write(stat_fn, f'{fast} {digest}')
+        return digest
+
+    def key(self, in_file: str, **config: str) -> str:
+        """Construct a cache key for an input file.
+
+        Arguments:
+            in_file: path to input file.
+            config: everything else that determines the result.
+
+        Returns:
+            The cache key.
+        """
+        conf = json.dumps(config, sort_keys=True)
+        return hashlib.sha256(
+            f'{self.content_hash(in_file)}\n{conf}'.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Lookup a cached result.
+
+        Arguments:
+            key: cache key.
+
+        Returns:
+            The saved result data, or None on a miss.
+        """
+        if not os.path.isfile(fn := self.entry(key)):
+            return None
+        try:
+            with open(fn) as fl:
+                data = json.load(fl)
+        except (OSError, ValueError):
+            logger.warning(f'discarding broken cache entry {fn}')
+            return None
+        os.utime(fn)  # mark recently used
+        return data
+
+    def put(self, key: str, result: dict) -> None:
+        """Store a result.
+
+        Arguments:
+            key: cache key.
+            result: the result to store.
+        """
+        self.__write(self.entry(key), json.dumps(result))
+
+    def folders(self) -> List[str]:
+        """Directories that share the cache size limit."""
+        return [os.path.join(self.path, f) for f in (
+            ResultCache.ENTRIES, MethodCache.ENTRIES,
+            ShapeCache.ENTRIES, ResultCache.STATS)]
+
+    def evict(self) -> int:
+        """Remove least recently used entries, of all caches in
+        the cache directory, until they fit the size limit.
+
+        Returns:
+            Number of evicted entries.
+        """
+        entries = sorted(
+            (e.stat().st_mtime_ns, e.stat().st_size, e.path)
+            for folder in self.folders() if os.path.isdir(folder)
+            for e in os.scandir(folder) if e.is_file())
+        total, evicted = sum(e[1] for e in entries), 0
+        for _, size, fn in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(fn)
+            total, evicted = total - size, evicted + 1
+        if evicted:
+            logger.debug(f'evicted {evicted} cache entries')
+        return evicted
+
+    @staticmethod
+    def __write(fn: str, text: str) -> None:
+        """Write atomically, since workers may share the cache."""
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        tmp = f'{fn}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as fl:
+            fl.write(text)
+        os.replace(tmp, fn)
+
+
+class MethodCache(ResultCache):
+    """Cache of method-level analysis results.
+
+    Entries are keyed by the analyzer (e.g., by a hash of the
+    method tokens) and stored in a normalized form, where every
+    identifier is replaced by a placeholder `#0, #1…`, in order of
+    first occurrence. Methods that differ only by consistent
+    renaming therefore share an entry; the names of the concrete
+    method are substituted back on a hit.
+
+    Entries are kept in memory, in a bounded least recently used
+    order, shared by all files analyzed by the same process, and
+    optionally persisted next to the file-level result cache.
+    """
+
+    ENTRIES = 'methods'
+    MEMO = OrderedDict()
+    ID = re.compile(r'[^.#₀-₉]+')
+    PH = re.compile(r'#(\d+)')
+    LEVEL = re.compile(r'l\(([^)]*)\)')
+
+    def __init__(self, path: Optional[str] = None, max_mb: float = 256,
+                 solver: Optional[str] = None, max_entries: int = 4096):
+        """Initialize a method cache.
+
+        Arguments:
+            path: cache directory; if None, cache is in-memory only.
+            max_mb: cache size limit on disk, in megabytes.
+            solver: solver info; if None, verdicts are not reused.
+            max_entries: number of entries kept in memory.
+        """
+        super().__init__(path, max_mb)
+        self.memo = MethodCache.MEMO
+        self.solver = solver
+        self.max_entries = max_entries
+
+    @staticmethod
+    def encode(name: str, names: List[str]) -> str:
+        """Replace identifiers in a variable name by placeholders.
+
+        Arguments:
+            name: variable name, e.g. `a.b` or `i₂`.
+            names: identifier table of the method.
+
+        Raises:
+            ValueError: if name contains an unknown identifier.
+
+        Returns:
+            Normalized variable name, e.g. `#0.#1` or `#3₂`.
+        """
+        return MethodCache.ID.sub(
+            lambda m: f'#{names.index(m.group())}', name)
+
+    @staticmethod
+    def decode(name: str, names: List[str]) -> str:
+        """Inverse of encode."""
+        return MethodCache.PH.sub(lambda m: names[int(m.group(1))], name)
+
+    def store(self, result: dict) -> None:
+        """Update the cache from an analysis result.
+
+        Arguments:
+            result: a result with analyzed methods.
+        """
+        ar = result.get('analysis_result') or {}
+        for method in [m for c in ar.values() for m in c.values()]:
+            if not method.digest or method.memo is None:
+                continue
+            entry, names = dict(method.memo), method.names
+            if method.sat and method.sat != 'UNKNOWN' and self.solver:
+                model = method.model and self.LEVEL.sub(
+                    lambda m: f'l({self.encode(m.group(1), names)})',
+                    method.model)
+                entry.update(solver=self.solver, sat=method.sat,
+                             model=model)
+            self.put(method.digest, entry)
+
+    def restore(self, method, entry: dict) -> None:
+        """Reuse a cached verdict for a method, if applicable.
+
+        Arguments:
+            method: method result to update.
+            entry: cache entry of the method.
+        """
+        if self.solver and entry.get('solver') == self.solver:
+            names = method.names
+            method.sat = entry['sat']
+            method.model = entry['model'] and self.LEVEL.sub(
+                lambda m: f'l({self.decode(m.group(1), names)})',
+                entry['model'])
+            method.reused = True
+
+    def get(self, key: str) -> Optional[dict]:
+        if key in self.memo:
+            self.memo.move_to_end(key)
+            return self.memo[key]
+        if self.path and (data := super().get(key)) is not None:
+            self.__remember(key, data)
+            return data
+        return None
+
+    def put(self, key: str, entry: dict) -> None:
+        if self.memo.get(key) == entry:
+            return
+        self.__remember(key, entry)
+        super().put(key, entry) if self.path else None
+
+    def evict(self) -> int:
+        return super().evict() if self.path else 0
+
+    def __remember(self, key: str, entry: dict) -> None:
+        self.memo[key] = entry
+        self.memo.move_to_end(key)
+        while len(self.memo) > self.max_entries:
+            self.memo.popitem(last=False)
+
+
+class ShapeCache(ResultCache):
+    """Cache of solver results, keyed by constraint-graph shape.
+
+    Methods whose constraints are equal up to renaming variables
+    share an entry. An entry holds the verdict, and the model as
+    a list of levels in canonical variable order.
+
+    Entries are kept in memory, in a bounded least recently used
+    order, shared by all files analyzed by the same process, and
+    optionally persisted next to the file-level result cache.
+    """
+
+    ENTRIES = 'shapes'
+    MEMO = OrderedDict()
+    LOCK = threading.Lock()
+
+    def __init__(self, path: Optional[str] = None, max_mb: float = 256,
+                 max_entries: int = 4096):
+        """Initialize a shape cache.
+
+        Arguments:
+            path: cache directory; if None, cache is in-memory only.
+            max_mb: cache size limit on disk, in megabytes.
+            max_entries: number of entries kept in memory.
+        """
+        super().__init__(path, max_mb)
+        self.memo = ShapeCache.MEMO
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.LOCK:
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                return self.memo[key]
+        if self.path and (data := super().get(key)) is not None:
+            self.__remember(key, data)
+            return data
+        return None
+
+    def put(self, key: str, entry: dict) -> None:
+        self.__remember(key, entry)
+        super().put(key, entry) if self.path else None
+
+    def evict(self) -> int:
+        return super().evict() if self.path else 0
+
+    def __remember(self, key: str, entry: dict) -> None:
+        with self.LOCK:
+            self.memo[key] = entry
+            self.memo.move_to_end(key)
+            while len(self.memo) > self.max_entries:
+                self.memo.popitem(last=False)
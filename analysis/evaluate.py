@@ -1,69 +1,609 @@
+from __future__ import annotations
+
 # noinspection PyPackageRequirements
+import hashlib
+import json
 import logging
-from typing import Optional, Dict
+import operator
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
 
 # noinspection PyPackageRequirements
-from z3 import Solver, Ints, get_full_version
+from z3 import Bool, Context, SolverFor, parse_smt2_string, \
+    get_full_version
 
 from . import Result, AnalysisResult, MethodResult, Timeable
+from . import __version__
+from .cache import ShapeCache
+from .graph import least_levels, least_joins, canonical_order, \
+    successors, shortest_paths, path_to
+from .lattice import Lattice
+from .policy import Policy
+from .reduction import Reduction
 
 logger = logging.getLogger(__name__)
 
 
 class Evaluate:
+    """Decides the flow constraints of analyzed methods.
+
+    Solver backends:
+
+    - `z3`: solve the constraints with Z3.
+    - `native`: solve the constraints as a graph problem, and
+      find the least security level of each variable.
+    - `check`: solve natively, and cross-validate the verdict
+      and model with Z3.
+
+    Methods are independent constraint systems, so they can be
+    solved by a pool of worker threads. Each worker (or the main
+    thread) keeps one Z3 session, in its own Z3 context.
+
+    Optionally, the constraint graph of each method is reduced
+    before solving, and the model is extended back to all
+    variables (see Reduction).
+
+    Optionally, solver results are memoized by the shape of the
+    constraint graph, so methods that are equal up to renaming
+    are solved once (see ShapeCache).
+
+    Evaluation is anytime: with a per-method timeout, or a budget
+    for all methods, methods that are not decided in time are
+    UNKNOWN, and the other results are kept.
+
+    Optionally, each method is checked against the policies that
+    apply to it; policies fix the levels of some variables, and
+    each policy is SAT if the flows of the method respect it.
+    Policy levels are integers, or elements of a finite lattice:
+    lattice policies are solved natively by join propagation, also
+    with the z3 solver; the check solver validates them with Z3 in
+    a bitvector encoding.
+    """
+
+    MODEL = re.compile(r'l\((.*?)\)=(-?\d+)')
+
+    def __init__(self, result: Result, solver: str = 'z3',
+                 smtlib: bool = True, reduce: Optional[str] = None,
+                 memo: Optional[ShapeCache] = None,
+                 timeout: Optional[float] = None,
+                 budget: Optional[float] = None,
+                 policies: Optional[List[Policy]] = None,
+                 session: Optional[Z3Session] = None,
+                 lattice: Optional[Lattice] = None):
+        """Initialize evaluation.
 
-    def __init__(self, result: Result):
+        Arguments:
+            result: result with analyzed methods.
+            solver: solver backend.
+            smtlib: record the SMT-LIB encoding of each method.
+            reduce: reduction mode (see Reduction), or None.
+            memo: solver results by graph shape, or None.
+            timeout: time limit per method, in seconds.
+            budget: time limit for all methods, in seconds.
+            policies: security policies to check, or None.
+            session: Z3 session of the calling thread, e.g.,
+                to reuse one session for many results.
+            lattice: security lattice of policy levels, or None
+                for integer levels.
+        """
         self.result = result
+        self.solver = solver
+        self.smtlib = smtlib
+        self.reduce = reduce
+        self.memo = memo
+        self.timeout = timeout
+        self.budget = budget
+        self.policies = policies or []
+        self.lattice = lattice
+        self.deadline: Optional[int] = None  # ns, when budget ends
+        self.local = threading.local()  # per-worker Z3 session
+        if session is not None:
+            self.local.session = session
+        self.backend = {'z3': Evaluate.solve,
+                        'native': Evaluate.solve_native,
+                        'check': Evaluate.check}[solver]
 
     @staticmethod
-    def info():
-        return f'Z3 {get_full_version()}'
+    def info(solver: str = 'z3'):
+        z3, native = f'Z3 {get_full_version()}', f'native {__version__}'
+        return {'z3': z3, 'native': native,
+                'check': f'{native} (checked: {z3})'}[solver]
 
     @property
     def ar(self) -> AnalysisResult:
         return self.result.analysis_result
 
-    def solve_all(self, t: Optional[Timeable] = None):
+    def solve_all(self, t: Optional[Timeable] = None, jobs: int = 1):
+        """Solve all methods of the analysis result.
+
+        Arguments:
+            t: timer; records wall time, and the summed time
+                spent solving methods.
+            jobs: number of worker threads.
+        """
         cls_methods = [j for sub in [[
             (c, m) for m in self.ar.children_of(c).keys()
-            if self.ar[c][m].ids]
+            if self.ar[c][m].ids and (
+                not self.ar[c][m].reused or self.policies
+                or self.smtlib or self.reduce)]
             for c in self.ar.children()] for j in sub]
         logger.debug(f'Methods to evaluate: {len(cls_methods)}')
         t.start() if t else None
-        for (cls, m_name) in cls_methods:
-            method = self.ar[cls][m_name]
-            logger.debug(f'Evaluating {cls}.{m_name}')
-            Evaluate.solve(method)
-        t.stop() if t else None
+        self.deadline = None if self.budget is None else \
+            time.perf_counter_ns() + int(self.budget * 1e9)
+        if jobs > 1 and len(cls_methods) > 1:
+            logger.debug(f'Using {jobs} solver threads')
+            with ThreadPoolExecutor(
+                    max_workers=jobs, initializer=self.__init_worker) \
+                    as pool:
+                work = sum(pool.map(self.__solve_one, cls_methods))
+        else:
+            work = sum(map(self.__solve_one, cls_methods))
+        t.stop().add_work(work) if t else None
+        if unknown := [m for c, m in cls_methods
+                       if self.ar[c][m].sat == 'UNKNOWN']:
+            logger.warning(f'Undecided in time: {len(unknown)} methods')
         logger.debug("Evaluation completed")
 
-    # noinspection PyPep8Naming
+    def __init_worker(self):
+        self.local.session = Z3Session(Context(), self.smtlib)
+
+    def __solve_one(self, cls_method) -> int:
+        """Solve one method, in place.
+
+        Returns:
+            Time spent, in nanoseconds.
+        """
+        cls, m_name = cls_method
+        logger.debug(f'Evaluating {cls}.{m_name}')
+        if (session := getattr(self.local, 'session', None)) is None:
+            session = self.local.session = Z3Session(smtlib=self.smtlib)
+        start, method = time.perf_counter_ns(), self.ar[cls][m_name]
+        if (limit := self.__time_left(start)) is not None and limit <= 0:
+            logger.debug(f'Evaluation budget exhausted: {cls}.{m_name}')
+            if not method.reused:
+                method.sat, method.elapsed = 'unknown', 0.0
+            self.__check_policies(method, session, exhausted=True)
+            return 0
+        session.timeout = limit
+        if not method.reused:
+            self.__solve_method(method, session)
+        elif self.smtlib or self.reduce:
+            self.__encode_reused(method)
+        method.timed('solve', start)
+        if self.policies:
+            checked = time.perf_counter_ns()
+            self.__check_policies(method, session)
+            method.timed('policies', checked)
+        elapsed = time.perf_counter_ns() - start
+        if method.sat == 'UNKNOWN' and not method.reused:
+            logger.warning(f'Timeout: {cls}.{m_name}')
+            method.elapsed = elapsed / 1e9
+        return elapsed
+
+    def __solve_method(self, method: MethodResult, session: Z3Session):
+        """Solve the flow constraints of a method, in place."""
+        red = Reduction(method, self.reduce) if self.reduce else None
+        target = red.reduced() if red else method
+        if target.ids:
+            self.__memo_solve(target, session)
+        else:  # everything was reduced away
+            target.sat = 'sat'
+        if self.smtlib and target.smtlib is None:
+            target.smtlib = Z3Session.encode(target)
+        if red:
+            method.sat, method.smtlib = target.sat, target.smtlib
+            method.model = red.expand(target.model) \
+                if target.sat == 'SAT' else None
+            method.reduction = red.stats
+
+    def __encode_reused(self, method: MethodResult):
+        """Record the encoding and reduction of a method whose
+        verdict came from the method cache, without solving."""
+        red = Reduction(method, self.reduce) if self.reduce else None
+        target = red.reduced() if red else method
+        if self.smtlib and method.smtlib is None:
+            method.smtlib = Z3Session.encode(target)
+        if red:
+            method.reduction = red.stats
+
+    def __check_policies(self, method: MethodResult, session: Z3Session,
+                         exhausted: bool = False):
+        """Check the policies that apply to a method, in place.
+
+        Arguments:
+            method: an analyzed method.
+            session: Z3 session of the current thread.
+            exhausted: evaluation budget is exhausted; the
+                policies are UNKNOWN.
+        """
+        applicable = [(p.name, lv) for p in self.policies
+                      if p.applies(method.full_name)
+                      and (lv := p.levels_of(method.ids))]
+        if not applicable:
+            return
+        names, levels = zip(*applicable)
+        verdicts = ['UNKNOWN'] * len(levels) if exhausted else \
+            Evaluate.check_policies(method, list(levels), session,
+                                    self.solver, self.lattice)
+        method.policies = dict(zip(names, verdicts))
+        if 'UNSAT' in verdicts:
+            method.violations = {
+                n: Evaluate.violations(method, lv, self.lattice)
+                for n, lv, v
+                in zip(names, levels, verdicts) if v == 'UNSAT'}
+
+    @staticmethod
+    def violations(method: MethodResult, levels: Dict[str, int],
+                   lattice: Optional[Lattice] = None) -> List[List[str]]:
+        """Flows that violate known levels of variables.
+
+        Levels are violated exactly when a variable flows to a
+        variable of a level that is not higher or equal. For
+        every such pair, the shortest chain of flows is found by
+        breadth-first search.
+
+        Arguments:
+            method: an analyzed method.
+            levels: known security levels of variables.
+            lattice: lattice of the levels (element indices),
+                or None for integer levels.
+
+        Returns:
+            The chains, as lists of variables from high to low,
+            ordered by source and sink.
+        """
+        vrs = method.ids
+        index = {v: i for i, v in enumerate(vrs)}
+        succ = successors(len(vrs), (
+            (index[a], index[b]) for a, b in method.flows))
+        fixed = sorted(index[v] for v in levels if v in index)
+        leq = lattice.leq if lattice else operator.le
+        chains = []
+        for src in fixed:
+            low = [d for d in fixed if d != src and not leq(
+                levels[vrs[src]], levels[vrs[d]])]
+            pred = shortest_paths(succ, src) if low else []
+            chains += [[vrs[v] for v in path] for d in low
+                       if (path := path_to(pred, d))]
+        return chains
+
+    @staticmethod
+    def check_policies(method: MethodResult, policies: List[Dict[str, int]],
+                       session: Optional[Z3Session] = None,
+                       solver: str = 'z3',
+                       lattice: Optional[Lattice] = None) -> List[str]:
+        """Check a method against several policies.
+
+        Arguments:
+            method: an analyzed method.
+            policies: known security levels of variables, for
+                each policy.
+            session: Z3 session; if None, a one-off session.
+            solver: solver backend.
+            lattice: lattice of the levels (element indices),
+                or None for integer levels. Lattice levels are
+                solved natively, unless solver is check.
+
+        Returns:
+            The verdict of each policy: SAT, UNSAT, or UNKNOWN.
+        """
+        if solver == 'native' or (lattice is not None and solver == 'z3'):
+            return [Evaluate.__native_verdict(method, lv, lattice)
+                    for lv in policies]
+        verdicts = (session or Z3Session()).check_policies(
+            method, policies, lattice)
+        if solver == 'check':
+            for i, lv in enumerate(policies):
+                native = Evaluate.__native_verdict(method, lv, lattice)
+                if verdicts[i] == 'UNKNOWN':
+                    verdicts[i] = native
+                elif verdicts[i] != native:
+                    logger.error(f'native solver disagrees with Z3: '
+                                 f'{method.full_name}, policy {i}')
+        return verdicts
+
+    @staticmethod
+    def __native_verdict(method: MethodResult, levels: Dict[str, int],
+                         lattice: Optional[Lattice] = None) -> str:
+        vrs = method.ids
+        index = {v: i for i, v in enumerate(vrs)}
+        edges = ((index[a], index[b]) for a, b in method.flows)
+        fixed = {index[v]: k for v, k in levels.items()}
+        solution = least_levels(len(vrs), edges, fixed) \
+            if lattice is None else least_joins(
+                len(vrs), edges, fixed, lattice.join, lattice.leq,
+                lattice.bottom)
+        return 'UNSAT' if solution is None else 'SAT'
+
+    def __time_left(self, now: int) -> Optional[float]:
+        """Time limit of a method starting now, in seconds."""
+        left = [x for x in (
+            self.timeout, None if self.deadline is None
+            else (self.deadline - now) / 1e9) if x is not None]
+        return min(left) if left else None
+
+    def __memo_solve(self, method: MethodResult, session: Z3Session,
+                     **levels: Dict[str, int]):
+        """Solve a method, or reuse the result of an equal shape."""
+        if self.memo is None:
+            return self.backend(method, session, **levels)
+        key, order = Evaluate.shape(method, self.solver, **levels)
+        if (entry := self.memo.get(key)) is not None:
+            logger.debug(f'Same shape as a solved method: '
+                         f'{method.full_name}')
+            method.sat = entry['sat']
+            if entry['model'] is not None:
+                lv = dict(zip(order, entry['model']))
+                method.model = ', '.join(
+                    f'l({v})={lv[v]}' for v in method.ids)
+            return
+        self.backend(method, session, **levels)
+        if method.sat == 'UNKNOWN':
+            return  # another attempt may have more time
+        lv = dict(Evaluate.MODEL.findall(method.model or ''))
+        self.memo.put(key, {'sat': method.sat, 'model': None if
+                            method.sat != 'SAT' or method.model is None
+                            else [int(lv[v]) for v in order]})
+
+    @staticmethod
+    def shape(method: MethodResult, solver: str = '',
+              **levels: Dict[str, int]) -> Tuple[str, List[str]]:
+        """Relabeling-invariant key of the constraints of a method.
+
+        Arguments:
+            method: an analyzed method.
+            solver: solver backend.
+            levels: known security levels of variables.
+
+        Returns:
+            The key, and the method variables in canonical order.
+        """
+        vrs = method.ids
+        index = {v: i for i, v in enumerate(vrs)}
+        edges = [(index[a], index[b]) for a, b in method.flows]
+        labels = [levels.get(v, -1) for v in vrs]
+        order = canonical_order(len(vrs), edges, labels)
+        pos = {v: i for i, v in enumerate(order)}
+        form = [solver, len(vrs), [labels[v] for v in order],
+                sorted((pos[a], pos[b]) for a, b in edges)]
+        key = hashlib.sha256(json.dumps(form).encode()).hexdigest()
+        return key, [vrs[v] for v in order]
+
+    @staticmethod
+    def solve(method: MethodResult, session: Optional[Z3Session] = None,
+              /, **levels: Dict[str, int]):
+        """Solve flow constraints with Z3.
+
+        Arguments:
+            method: the method to solve, updated in place.
+            session: Z3 session; if None, a one-off session.
+            levels: known security levels of variables.
+        """
+        (session or Z3Session()).solve(method, **levels)
+
+    @staticmethod
+    def solve_native(method: MethodResult, _session=None, /,
+                     **levels: Dict[str, int]):
+        """Solve flow constraints without Z3.
+
+        The constraints are the same as in `solve`. The model
+        assigns the least satisfying level to every variable.
+        """
+        vrs = method.ids
+        index = {v: i for i, v in enumerate(vrs)}
+        solution = least_levels(
+            len(vrs), ((index[a], index[b]) for a, b in method.flows),
+            {index[v]: k for v, k in levels.items()})
+        method.sat = 'sat' if solution is not None else 'unsat'
+        if solution is not None:
+            method.model = ', '.join(
+                f'l({v})={k}' for v, k in zip(vrs, solution))
+
+    @staticmethod
+    def check(method: MethodResult, session: Optional[Z3Session] = None,
+              /, **levels: Dict[str, int]):
+        """Solve natively, and cross-validate the result with Z3.
+
+        Z3 must agree on satisfiability, and accept the native
+        model. On disagreement, the Z3 result is kept. If Z3
+        times out, the native result is kept unchecked.
+        """
+        Evaluate.solve_native(method, **levels)
+        sat, model = method.sat, method.model
+        session = session or Z3Session()
+        session.solve(method, **levels)
+        if method.sat == 'UNKNOWN':
+            logger.warning(f'native result not checked: '
+                           f'{method.full_name}')
+            method.sat, method.model = sat, model
+            return
+        fixed = dict(levels)
+        if sat == 'SAT':
+            fixed.update((v, int(k)) for v, k in
+                         Evaluate.MODEL.findall(model))
+        verified = sat == method.sat and (
+            sat != 'SAT' or Evaluate.__z3_accepts(method, session, fixed))
+        if not verified:
+            logger.error(f'native solver disagrees with Z3: '
+                         f'{method.full_name}')
+            return
+        method.model = model
+
     @staticmethod
-    def solve(method: MethodResult, **levels: Dict[str, int]):
-
-        solver = Solver()
-        vrs, flows = method.ids, method.flows
-        s_vars = Ints(' '.join([f'l({v})' for v in vrs]))
-
-        # security levels are (positive) ints
-        [solver.add(v >= 0) for v in s_vars]
-
-        # add flow constraints
-        for (in_, out_) in flows:
-            idx1, idx2 = vrs.index(in_), vrs.index(out_)
-            inInt, outInt = s_vars[idx1], s_vars[idx2]
-            solver.add(inInt <= outInt)
-
-        # if levels are known
-        for v_name, level in levels.items():
-            vInt = s_vars[vrs.index(v_name)]
-            solver.add(vInt == level)
-
-        method.smtlib = solver.sexpr()
-
-        # check sat/unsat
-        method.sat = str(solver.check())
-        if method.sat.lower() == 'sat':
-            method.model = (str(solver.model())[1:-1]
-                            .replace(' = ', '=')
-                            .replace('\n', ''))
+    def __z3_accepts(method: MethodResult, session: Z3Session,
+                     levels: Dict[str, int]) -> bool:
+        """Check that levels satisfy the constraints of a method."""
+        probe = MethodResult.init(method)
+        session.solve(probe, **levels)
+        return probe.sat == 'SAT'
+
+
+class Z3Session:
+    """An incremental Z3 solver, reused for many methods.
+
+    The constraints of a method are asserted in a new scope,
+    which is popped after the check, so nothing carries over to
+    the next method. The solver is specialized for the integer
+    difference logic (QF_IDL) that the flow constraints are in.
+
+    A session is not thread-safe: use one per thread, each with
+    its own context.
+    """
+
+    LOGIC = 'QF_IDL'
+    NO_LIMIT = 4294967295  # Z3 timeout (ms) for no timeout
+
+    def __init__(self, ctx: Optional[Context] = None, smtlib: bool = True):
+        """Initialize a Z3 session.
+
+        Arguments:
+            ctx: Z3 context; if None, the default context.
+            smtlib: record the SMT-LIB encoding of solved methods.
+        """
+        self.ctx = ctx
+        self.smtlib = smtlib
+        self.timeout: Optional[float] = None  # seconds, per check
+        self.solver = SolverFor(self.LOGIC, ctx=ctx)
+        self.bv_solver = None  # for lattice levels, on first use
+
+    @staticmethod
+    def encode(method: MethodResult, **levels: Dict[str, int]) -> str:
+        """Encode the flow constraints of a method in SMT-LIB.
+
+        The text matches how Z3 prints the same assertions.
+
+        Arguments:
+            method: an analyzed method.
+            levels: known security levels of variables.
+
+        Returns:
+            The SMT-LIB declarations and assertions.
+        """
+        lv, num = Z3Session.__var, Z3Session.__num
+        lv = {v: lv(v) for v in method.ids}
+        return ''.join([
+            *(f'(declare-fun {x} () Int)\n' for x in lv.values()),
+            # security levels are (positive) ints
+            *(f'(assert (>= {x} 0))\n' for x in lv.values()),
+            # add flow constraints
+            *(f'(assert (<= {lv[a]} {lv[b]}))\n' for a, b in method.flows),
+            # if levels are known
+            *(f'(assert (= {lv[v]} {num(k)}))\n' for v, k in levels.items())])
+
+    @staticmethod
+    def __var(v: str) -> str:
+        return f'|l({v})|'
+
+    @staticmethod
+    def __num(k: int) -> str:
+        return str(k) if k >= 0 else f'(- {-k})'
+
+    def __limit(self, solver=None) -> None:
+        """Apply the time limit to the next checks."""
+        (solver or self.solver).set(
+            timeout=self.NO_LIMIT if self.timeout is None
+            else max(1, int(self.timeout * 1000)))
+
+    @staticmethod
+    def encode_lattice(method: MethodResult, lattice: Lattice) -> str:
+        """Encode the flow constraints of a method in SMT-LIB,
+        over the elements of a lattice.
+
+        Levels are bitvectors of join-irreducible elements (see
+        Lattice), so `l(a) ≤ l(b)` is `l(a) | l(b) = l(b)`, and
+        every level must be the code of an element.
+
+        Arguments:
+            method: an analyzed method.
+            lattice: security lattice.
+
+        Returns:
+            The SMT-LIB declarations and assertions.
+        """
+        lv = {v: Z3Session.__var(v) for v in method.ids}
+        width = lattice.width
+        member = (lambda x: '(or ' + ' '.join(
+            f'(= {x} (_ bv{c} {width}))' for c in lattice.codes) + ')')
+        return ''.join([
+            *(f'(declare-fun {x} () (_ BitVec {width}))\n'
+              for x in lv.values()),
+            *(f'(assert {member(x)})\n' for x in lv.values()),
+            *(f'(assert (= (bvor {lv[a]} {lv[b]}) {lv[b]}))\n'
+              for a, b in method.flows)])
+
+    def solve(self, method: MethodResult, **levels: Dict[str, int]):
+        """Solve the flow constraints of a method.
+
+        Every variable gets a level `l(v) ≥ 0`, and every flow
+        (a, b) requires `l(a) ≤ l(b)`.
+
+        Arguments:
+            method: the method to solve, updated in place.
+            levels: known security levels of variables.
+        """
+        script, solver = self.encode(method, **levels), self.solver
+        solver.push()
+        try:
+            # parse in one call, instead of building Python ASTs
+            solver.add(parse_smt2_string(script, ctx=self.ctx))
+            if self.smtlib:
+                method.smtlib = script
+
+            # check sat/unsat; unknown on timeout
+            self.__limit()
+            method.sat = str(solver.check())
+            if method.sat.lower() == 'sat':
+                # format directly: the Z3 printer is not thread-safe
+                model = solver.model()
+                method.model = ', '.join(
+                    f'{d.name()}={model[d].as_long()}'
+                    for d in model.decls())
+        finally:
+            solver.pop()
+
+    def check_policies(self, method: MethodResult,
+                       policies: List[Dict[str, int]],
+                       lattice: Optional[Lattice] = None) -> List[str]:
+        """Check the flow constraints of a method against policies.
+
+        The constraints are asserted once. The levels of each
+        policy are guarded by an assumption literal `p<i>`, so
+        every policy is one check under one assumption, and the
+        solver keeps what it learned between checks.
+
+        Arguments:
+            method: an analyzed method.
+            policies: known security levels of variables, for
+                each policy.
+            lattice: lattice of the levels (element indices); if
+                given, levels are encoded as bitvectors.
+
+        Returns:
+            The verdict of each policy: SAT, UNSAT, or UNKNOWN;
+            the time limit applies to each check.
+        """
+        lv, num = Z3Session.__var, Z3Session.__num
+        if lattice is not None:
+            width = lattice.width
+            num = (lambda k: f'(_ bv{lattice.codes[k]} {width})')
+            if self.bv_solver is None:
+                self.bv_solver = SolverFor('QF_BV', ctx=self.ctx)
+        script = (self.encode(method) if lattice is None else
+                  self.encode_lattice(method, lattice)) + ''.join(
+            f'(declare-fun |p{i}| () Bool)\n' + ''.join(
+                f'(assert (=> |p{i}| (= {lv(v)} {num(k)})))\n'
+                for v, k in levels.items())
+            for i, levels in enumerate(policies))
+        solver = self.solver if lattice is None else self.bv_solver
+        solver.push()
+        try:
+            solver.add(parse_smt2_string(script, ctx=self.ctx))
+            self.__limit(solver)
+            return [str(solver.check(Bool(f'p{i}', self.ctx))).upper()
+                    for i in range(len(policies))]
+        finally:
+            solver.pop()
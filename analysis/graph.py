@@ -0,0 +1,286 @@
+"""Graph algorithms over data-flow graphs.
+
+Graphs have nodes `0…n-1` and are given as successor lists,
+or as a list of edges (pairs of nodes).
+"""
+
+from __future__ import annotations
+
+import operator
+from typing import List, Tuple, Dict, Iterable, Optional, Callable, \
+    TypeVar
+
+EDGES_T = Iterable[Tuple[int, int]]
+"""Type of graph edges."""
+
+T = TypeVar('T')
+"""Type of security levels."""
+
+
+def successors(n: int, edges: EDGES_T) -> List[List[int]]:
+    """Successor lists of a graph.
+
+    Arguments:
+        n: number of nodes.
+        edges: graph edges.
+
+    Returns:
+        A list of successors for each node.
+    """
+    succ = [[] for _ in range(n)]
+    for src, dst in edges:
+        succ[src].append(dst)
+    return succ
+
+
+def scc(succ: List[List[int]]) -> List[List[int]]:
+    """Strongly connected components (Tarjan's algorithm).
+
+    The algorithm is iterative, so deep graphs do not hit
+    the recursion limit.
+
+    Arguments:
+        succ: successor lists of a graph.
+
+    Returns:
+        The components in topological order: for every edge
+        between components, the source component comes first.
+    """
+    n = len(succ)
+    index, low = [-1] * n, [0] * n
+    on_stack, stack, result, counter = [False] * n, [], [], 0
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+        work = [(root, 0)]
+        while work:
+            v, i = work.pop()
+            if i == 0:
+                index[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                on_stack[v] = True
+            for j in range(i, len(succ[v])):
+                w = succ[v][j]
+                if index[w] < 0:
+                    work += [(v, j + 1), (w, 0)]
+                    break
+                if on_stack[w]:
+                    low[v] = min(low[v], index[w])
+            else:
+                if low[v] == index[v]:
+                    comp = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        comp.append(w)
+                        if w == v:
+                            break
+                    result.append(comp)
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+    return result[::-1]
+
+
+def condense(succ: List[List[int]]) \
+        -> Tuple[List[int], List[List[int]], List[List[int]]]:
+    """Condensation of a graph: the DAG of its components.
+
+    Arguments:
+        succ: successor lists of a graph.
+
+    Returns:
+        A triple of: component of each node; nodes of each
+        component, in topological order; and deduplicated
+        successor lists of the components.
+    """
+    comps = scc(succ)
+    comp_of = [0] * len(succ)
+    for c, nodes in enumerate(comps):
+        for v in nodes:
+            comp_of[v] = c
+    dag = [sorted({comp_of[w] for v in nodes for w in succ[v]} - {c})
+           for c, nodes in enumerate(comps)]
+    return comp_of, comps, dag
+
+
+def closure(n: int, edges: EDGES_T) -> List[int]:
+    """Transitive closure of a graph, as bitsets.
+
+    Reachability is computed once per component of the
+    condensation, in reverse topological order, so each
+    component is the union of the sets of its successors.
+
+    Arguments:
+        n: number of nodes.
+        edges: graph edges.
+
+    Returns:
+        For each node, the bitset of nodes that it reaches by a
+        non-empty path (bit i for node i).
+    """
+    comp_of, comps, dag = condense(successors(n, edges))
+    bits = [sum(1 << v for v in nodes) for nodes in comps]
+    reach = [0] * len(comps)
+    for c in range(len(comps) - 1, -1, -1):
+        reach[c] = bits[c] if len(comps[c]) > 1 else 0
+        for d in dag[c]:
+            reach[c] |= bits[d] | reach[d]
+    return [reach[comp_of[v]] for v in range(n)]
+
+
+def shortest_paths(succ: List[List[int]], src: int) -> List[int]:
+    """Shortest paths from a node, by breadth-first search.
+
+    Arguments:
+        succ: successor lists of a graph.
+        src: source node.
+
+    Returns:
+        The predecessor of each node on a shortest path from src:
+        src for itself, and -1 for unreachable nodes.
+    """
+    pred = [-1] * len(succ)
+    pred[src], frontier = src, [src]
+    while frontier:
+        nxt = []
+        for v in frontier:
+            for w in succ[v]:
+                if pred[w] < 0:
+                    pred[w] = v
+                    nxt.append(w)
+        frontier = nxt
+    return pred
+
+
+def path_to(pred: List[int], dst: int) -> Optional[List[int]]:
+    """Path to a node, from predecessors of shortest_paths.
+
+    Returns:
+        The nodes of the path, or None if dst is unreachable.
+    """
+    if pred[dst] < 0:
+        return None
+    path = [dst]
+    while pred[path[-1]] != path[-1]:
+        path.append(pred[path[-1]])
+    return path[::-1]
+
+
+def least_levels(n: int, edges: EDGES_T, fixed: Dict[int, int]) \
+        -> Optional[List[int]]:
+    """Least solution of flow constraints over integer levels.
+
+    The constraints are `l(v) ≥ 0` for every node, `l(a) ≤ l(b)`
+    for every edge (a, b), and `l(v) = k` for every fixed node.
+
+    Arguments:
+        n: number of nodes.
+        edges: graph edges.
+        fixed: known levels of nodes.
+
+    Returns:
+        The least level of every node, or None if the
+        constraints are unsatisfiable.
+    """
+    if any(k < 0 for k in fixed.values()):
+        return None
+    return least_joins(n, edges, fixed, max, operator.le, 0)
+
+
+def least_joins(n: int, edges: EDGES_T, fixed: Dict[int, T],
+                join: Callable[[T, T], T], leq: Callable[[T, T], bool],
+                bottom: T) -> Optional[List[T]]:
+    """Least solution of flow constraints over a lattice.
+
+    The constraints are `l(a) ≤ l(b)` for every edge (a, b), and
+    `l(v) = k` for every fixed node. Nodes of a component have
+    equal levels, so the components are solved in topological
+    order, by propagating the join of the levels of predecessors
+    (linear time, in lattice operations).
+
+    Arguments:
+        n: number of nodes.
+        edges: graph edges.
+        fixed: known levels of nodes.
+        join: least upper bound of two levels.
+        leq: order of levels.
+        bottom: least level.
+
+    Returns:
+        The least level of every node, or None if the
+        constraints are unsatisfiable.
+    """
+    comp_of, comps, dag = condense(successors(n, edges))
+    level = [bottom] * len(comps)
+    exact: Dict[int, T] = {}
+    for v, k in fixed.items():
+        if exact.setdefault(comp_of[v], k) != k:
+            return None  # one component at two levels
+    for c in range(len(comps)):
+        if c in exact:
+            if not leq(level[c], exact[c]):
+                return None  # flows from a higher level
+            level[c] = exact[c]
+        for d in dag[c]:
+            level[d] = join(level[d], level[c])
+    return [level[comp_of[v]] for v in range(n)]
+
+
+def canonical_order(n: int, edges: EDGES_T,
+                    labels: Optional[List[int]] = None,
+                    max_rounds: int = 32) -> List[int]:
+    """Relabeling-invariant order of graph nodes.
+
+    Nodes are colored by color refinement: a node's color is
+    refined by the colors of its successors and predecessors,
+    until the coloring is stable. Nodes that still share a color
+    are separated by individualizing one of them, and refining
+    again (at most max_rounds times; then remaining ties are
+    broken by node number).
+
+    Isomorphic graphs usually get the same order. The order is
+    not guaranteed canonical, so equal graphs must be confirmed,
+    e.g. by comparing edges under the order.
+
+    Arguments:
+        n: number of nodes.
+        edges: graph edges.
+        labels: optional initial colors, e.g., known levels.
+        max_rounds: limit of individualization rounds.
+
+    Returns:
+        The nodes, in canonical order.
+    """
+    edges = list(edges)
+    succ, pred = successors(n, edges), successors(
+        n, ((b, a) for a, b in edges))
+    color = list(labels) if labels else [0] * n
+
+    def refine(col: List[int]) -> List[int]:
+        while True:
+            sig = [(col[v], sorted(col[w] for w in succ[v]),
+                    sorted(col[w] for w in pred[v])) for v in range(n)]
+            rank = {s: i for i, s in enumerate(sorted(set(
+                (c, tuple(s), tuple(p)) for c, s, p in sig)))}
+            new = [rank[(c, tuple(s), tuple(p))] for c, s, p in sig]
+            if len(set(new)) == len(set(col)):
+                return new
+            col = new
+
+    color = refine(color)
+    for _ in range(max_rounds):
+        if len(set(color)) == n:
+            break
+        # individualize first node of the smallest tied color
+        seen, tied = set(), None
+        for v in sorted(range(n), key=lambda x: color[x]):
+            if color[v] in seen:
+                tied = color[v]
+                break
+            seen.add(color[v])
+        first = min(v for v in range(n) if color[v] == tied)
+        color = refine([2 * c + (c == tied and v != first)
+                        for v, c in enumerate(color)])
+    return sorted(range(n), key=lambda v: (color[v], v))
@@ -0,0 +1,138 @@
+"""Finite security lattices.
+
+By default, security levels are non-negative integers, a total
+order. A lattice file defines other orders, e.g., separate
+compartments of confidentiality, as JSON:
+
+```json
+{"elements": ["low", "A", "B", "high"],
+ "order": [["low", "A"], ["low", "B"], ["A", "high"], ["B", "high"]]}
+```
+
+The order lists pairs `[x, y]` where x ≤ y; it is closed
+reflexively and transitively. Alternatively, a powerset
+lattice of some atoms is given by `{"powerset": ["A", "B"]}`;
+its elements are written `{}`, `{A}`, `{A,B}`, etc.
+
+Each element x is represented by the bitset of elements below
+it (its down-set), so x ≤ y exactly when the down-set of x is
+included in the down-set of y. For Z3, elements are encoded as
+bitvectors of the join-irreducible elements below them, which
+preserves the order, and e.g. takes one bit per atom of a
+powerset.
+"""
+
+from __future__ import annotations
+
+import json
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+
+class Lattice:
+    """A finite lattice of security levels."""
+
+    def __init__(self, elements: List[str], order: List[List[str]],
+                 check: bool = True):
+        """Initialize a lattice.
+
+        Arguments:
+            elements: names of the lattice elements.
+            order: pairs [x, y] where x ≤ y.
+            check: verify that all pairs of elements have a join;
+                otherwise, joins are verified when first used.
+
+        Raises:
+            ValueError: if the order is not a lattice.
+        """
+        if len(set(elements)) < len(elements) or not elements:
+            raise ValueError('lattice elements must be unique')
+        self.elements = list(elements)
+        self.index: Dict[str, int] = {e: i for i, e in enumerate(elements)}
+        n = len(elements)
+        down = [1 << i for i in range(n)]
+        for x, y in order:
+            if x not in self.index or y not in self.index:
+                raise ValueError(f'unknown lattice element in {x} ≤ {y}')
+            down[self.index[y]] |= 1 << self.index[x]
+        for k in range(n):  # transitive closure (Warshall)
+            for i in range(n):
+                if down[i] >> k & 1:
+                    down[i] |= down[k]
+        if len(set(down)) < n:
+            raise ValueError('lattice order has a cycle')
+        self.down = down
+        self.joins: Dict[Tuple[int, int], int] = {}
+        if (bottom := self.__lub(0)) is None:
+            raise ValueError('lattice has no bottom element')
+        self.bottom = bottom
+        for x, y in combinations(range(n), 2) if check else ():
+            self.join(x, y)
+        # join-irreducible: not the join of the elements below
+        irreducible = [j for j in range(n)
+                       if self.__lub(down[j] & ~(1 << j)) != j]
+        self.codes = [sum(1 << k for k, j in enumerate(irreducible)
+                          if down[x] >> j & 1) for x in range(n)]
+        self.width = max(1, len(irreducible))
+
+    def __lub(self, below: int) -> Optional[int]:
+        """Least element above a set of elements (bitset)."""
+        upper = [u for u, d in enumerate(self.down) if d & below == below]
+        least = min(upper, key=lambda u: self.down[u].bit_count(),
+                    default=None)
+        return least if least is not None and all(
+            self.leq(least, u) for u in upper) else None
+
+    def leq(self, x: int, y: int) -> bool:
+        """x ≤ y, for element indices."""
+        return self.down[x] & ~self.down[y] == 0
+
+    def join(self, x: int, y: int) -> int:
+        """Least upper bound, for element indices.
+
+        Raises:
+            ValueError: if x and y have no least upper bound.
+        """
+        if (lub := self.joins.get((x, y))) is None:
+            if (lub := self.__lub(self.down[x] | self.down[y])) is None:
+                raise ValueError(f'no join of {self.elements[x]} '
+                                 f'and {self.elements[y]}')
+            self.joins[(x, y)] = self.joins[(y, x)] = lub
+        return lub
+
+    @staticmethod
+    def powerset(atoms: List[str]) -> Lattice:
+        """Lattice of all subsets of atoms, ordered by inclusion."""
+        name = (lambda s: '{' + ','.join(s) + '}')
+        subsets = [c for k in range(len(atoms) + 1)
+                   for c in combinations(atoms, k)]
+        return Lattice([name(s) for s in subsets], [
+            [name(s), name(tuple(b for b in atoms if b in s or b == a))]
+            for s in subsets for a in atoms if a not in s], check=False)
+
+    @staticmethod
+    def load(path: str) -> Lattice:
+        """Read a lattice file.
+
+        Arguments:
+            path: path to a JSON lattice file.
+
+        Raises:
+            ValueError: if the file is not a valid lattice file.
+
+        Returns:
+            The lattice.
+        """
+        with open(path) as fl:
+            data = json.load(fl)
+        if not isinstance(data, dict):
+            raise ValueError(f'{path}: expected a lattice definition')
+        try:
+            if 'powerset' in data:
+                return Lattice.powerset(list(data['powerset']))
+            return Lattice(list(data['elements']),
+                           list(data.get('order', [])))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'{path}: invalid lattice: {e}')
+        except ValueError as e:
+            raise ValueError(f'{path}: {e}')
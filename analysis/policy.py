@@ -0,0 +1,91 @@
+"""Security policies: known levels of variables.
+
+A policy file is a JSON list of policies:
+
+```json
+[
+  {"name": "secret-key",
+   "match": ["Program.*", "*.encrypt"],
+   "levels": {"key": 1, "out": 0}}
+]
+```
+
+A policy applies to every method whose full name (`Class.method`)
+matches one of its glob patterns; patterns default to all methods.
+Levels of variables that a method does not have are ignored.
+
+Levels are non-negative integers, or, with a security lattice
+(see Lattice), names of lattice elements.
+"""
+
+from __future__ import annotations
+
+import json
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional
+
+from .lattice import Lattice
+
+
+class Policy:
+    """Security levels assigned to variables."""
+
+    def __init__(self, name: str, levels: Dict[str, int],
+                 match: List[str] = None):
+        """Initialize a policy.
+
+        Arguments:
+            name: policy name.
+            levels: security levels of variables.
+            match: glob patterns of method full names.
+        """
+        self.name = name
+        self.levels = levels
+        self.match = match or ['*']
+
+    def applies(self, full_name: str) -> bool:
+        """True if policy applies to a method."""
+        return any(fnmatchcase(full_name, p) for p in self.match)
+
+    def levels_of(self, variables: List[str]) -> Dict[str, int]:
+        """Levels that the policy assigns to some variables."""
+        return {v: k for v, k in self.levels.items() if v in variables}
+
+    @staticmethod
+    def load(path: str, lattice: Optional[Lattice] = None) \
+            -> List[Policy]:
+        """Read a policy file.
+
+        Arguments:
+            path: path to a JSON policy file.
+            lattice: security lattice; if given, levels are
+                lattice elements, converted to element indices.
+
+        Raises:
+            ValueError: if the file is not a valid policy file.
+
+        Returns:
+            The policies, in file order.
+        """
+        with open(path) as fl:
+            data = json.load(fl)
+        if not isinstance(data, list):
+            raise ValueError(f'{path}: expected a list of policies')
+        policies = []
+        for i, entry in enumerate(data):
+            name = entry.get('name', f'policy-{i}')
+            levels, match = entry.get('levels'), entry.get('match', ['*'])
+            match = [match] if isinstance(match, str) else match
+            if lattice is not None and isinstance(levels, dict):
+                if unknown := set(levels.values()) - set(lattice.index):
+                    raise ValueError(f'{path}: {name}: unknown lattice '
+                                     f'elements: {sorted(unknown)}')
+                levels = {v: lattice.index[k] for v, k in levels.items()}
+            if not isinstance(levels, dict) or not all(
+                    isinstance(k, int) and k >= 0 for k in levels.values()):
+                raise ValueError(f'{path}: {name}: levels must map '
+                                 f'variables to non-negative integers')
+            policies.append(Policy(name, levels, match))
+        if len({p.name for p in policies}) < len(policies):
+            raise ValueError(f'{path}: policy names must be unique')
+        return policies
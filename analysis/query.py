@@ -0,0 +1,67 @@
+"""Source/sink queries over saved analysis results.
+
+Every analyzed method carries a reachability index of its
+flows (see MethodResult.reach), so queries are answered from
+saved results, without parsing or solving.
+
+```python
+from analysis.query import query
+for file, method, src, sink in query('out', 'request', 'query'):
+    ...
+```
+
+Sources and sinks are variable names, or glob patterns of
+variable names.
+"""
+
+from __future__ import annotations
+
+from fnmatch import fnmatchcase
+from typing import Iterator, Tuple
+
+from . import Result
+from .reeval import saved_results, load_saved
+
+MATCH_T = Tuple[str, str, str, str]
+"""A query match: file, method, source variable, sink variable."""
+
+
+def matches(result: Result, source: str, sink: str) \
+        -> Iterator[Tuple[str, str, str]]:
+    """Source/sink pairs of an analysis result.
+
+    Arguments:
+        result: an analysis result.
+        source: source variable, or glob pattern.
+        sink: sink variable, or glob pattern.
+
+    Returns:
+        Triples of method, source variable, and sink variable,
+        where the source flows to the sink, sorted by variable
+        within each method.
+    """
+    for method in [m for c in result.analysis_result.values()
+                   for m in c.values() if m.flows]:
+        for src in sorted(v for v in method.ids if fnmatchcase(v, source)):
+            for dst in sorted(method.reachable(src)):
+                if fnmatchcase(dst, sink):
+                    yield method.full_name, src, dst
+
+
+def query(corpus: str, source: str, sink: str) -> Iterator[MATCH_T]:
+    """Source/sink pairs of saved results.
+
+    Arguments:
+        corpus: saved result (JSON file), or a directory or
+            archive of saved results.
+        source: source variable, or glob pattern.
+        sink: sink variable, or glob pattern.
+
+    Returns:
+        The matches, in file order.
+    """
+    for name, text in saved_results(corpus):
+        if (result := load_saved(name, text)) is None:
+            continue
+        for found in matches(result, source, sink):
+            yield (result.infile, *found)
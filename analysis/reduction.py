@@ -0,0 +1,126 @@
+"""Reduction of method constraint graphs, before evaluation."""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Iterable
+
+from . import MethodResult
+from .graph import successors, condense
+
+
+class Reduction:
+    """Reduces the constraint graph of a method.
+
+    The constraints of a method are `l(a) ≤ l(b)` for each flow
+    (a, b), over non-negative levels. The reduction preserves
+    satisfiability, and every solution of the reduced graph
+    extends to a solution of the original graph.
+
+    - Variables of a cycle must have the same level, so each
+      strongly connected component becomes one variable, its
+      representative (the first member in variable order).
+    - Variables that no flow touches, after collapsing cycles,
+      are dropped; their level is 0.
+    - Optionally, the graph is projected onto interface variables
+      (parameters, fields, returns): other variables are dropped,
+      and an interface variable flows to another if it reaches
+      it in the original graph. A dropped variable takes the
+      highest level of the kept variables that reach it.
+
+    The mapping records how to recover the level of each variable
+    that is not kept: it is the maximum level of the listed kept
+    variables, or 0 if there are none.
+
+    Example:
+
+    ```python
+    red = Reduction(method, Reduction.INTERFACE)
+    proxy = red.reduced()
+    ...  # solve proxy
+    model = red.expand(proxy.model)
+    ```
+    """
+
+    SCC, INTERFACE = 'scc', 'interface'
+    MODES = (SCC, INTERFACE)
+    LEVEL = re.compile(r'l\((.*?)\)=(-?\d+)')
+
+    def __init__(self, method: MethodResult, mode: str = SCC,
+                 keep: Iterable[str] = ()):
+        """Reduce a method constraint graph.
+
+        Arguments:
+            method: an analyzed method.
+            mode: `scc`, or `interface` to also project the graph
+                onto interface variables; projection is skipped if
+                the interface of the method is unknown.
+            keep: variables that must not be dropped,
+                e.g., variables with known levels.
+        """
+        self.method = method
+        vrs, keep = method.ids, set(keep)
+        index = {v: i for i, v in enumerate(vrs)}
+        comp_of, comps, dag = condense(successors(
+            len(vrs), ((index[a], index[b]) for a, b in method.flows)))
+        rep = [vrs[min(c)] for c in comps]
+        has_in = {d for succ in dag for d in succ}
+        kept = [bool(dag[c] or c in has_in or keep & {vrs[v] for v in m})
+                for c, m in enumerate(comps)]
+        self.mode = mode
+        if mode == self.INTERFACE and method.interface is not None:
+            ifc = keep | set(method.interface)
+            kept = [k and bool(ifc & {vrs[v] for v in comps[c]})
+                    for c, k in enumerate(kept)]
+        elif mode == self.INTERFACE:
+            self.mode = self.SCC
+        # kept components that reach each component, as bitsets;
+        # components are in topological order
+        src = [0] * len(comps)
+        for c in range(len(comps)):
+            src[c] |= (1 << c) if kept[c] else 0
+            for d in dag[c]:
+                src[d] |= src[c]
+        members = (lambda bits: [c for c in range(len(comps))
+                                 if bits >> c & 1])
+        self.ids: List[str] = [rep[c] for c in range(len(comps)) if kept[c]]
+        self.flows = [(rep[c], rep[d]) for d in range(len(comps))
+                      if kept[d] for c in members(src[d]) if c != d] \
+            if self.mode == self.INTERFACE else \
+            [(rep[c], rep[d]) for c in range(len(comps))
+             for d in dag[c] if kept[c] and kept[d]]
+        self.mapping: Dict[str, List[str]] = {}
+        for c, nodes in enumerate(comps):
+            for v in (vrs[n] for n in nodes if vrs[n] != rep[c]
+                      or not kept[c]):
+                self.mapping[v] = [rep[c]] if kept[c] else \
+                    [rep[k] for k in members(src[c])]
+
+    @property
+    def stats(self) -> dict:
+        """Reduction statistics and variable mapping."""
+        return {'mode': self.mode,
+                'vars': [len(self.method.ids), len(self.ids)],
+                'flows': [len(self.method.flows), len(self.flows)],
+                'mapping': self.mapping}
+
+    def reduced(self) -> MethodResult:
+        """The reduced method, to be solved."""
+        return MethodResult(self.method.full_name, self.method.source,
+                            self.flows, self.ids, returns=set())
+
+    def expand(self, model: Optional[str]) -> Optional[str]:
+        """Extend a model of the reduced method to all variables.
+
+        Arguments:
+            model: model of the reduced method.
+
+        Returns:
+            The model of the original method, in variable order.
+        """
+        if model is None:
+            return None
+        levels = {v: int(k) for v, k in self.LEVEL.findall(model)}
+        for v, kept in self.mapping.items():
+            levels[v] = max((levels[k] for k in kept), default=0)
+        return ', '.join(f'l({v})={levels[v]}' for v in self.method.ids)
@@ -0,0 +1,263 @@
+"""Bulk re-evaluation of saved analysis results.
+
+Reads saved results (JSON files) from a directory or an archive
+(zip, tar), and evaluates them again under another solver or
+policy configuration, without parsing or analyzing programs.
+Only verdicts that changed are reported.
+
+```
+python3 -m analysis.reeval out --policy policy.json -j 4
+```
+
+Each worker process keeps one Z3 session, and loads the policies
+and lattice once, for all results it evaluates.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import tarfile
+import zipfile
+from argparse import ArgumentParser, Namespace, RawTextHelpFormatter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from . import Result, utils
+
+logger = logging.getLogger(__name__)
+
+CHANGE_T = Tuple[str, str, Optional[str], Optional[str], Optional[str]]
+"""A changed verdict: file, method, policy (None for the method
+verdict), old verdict, and new verdict."""
+
+__SESSION = {}  # Z3 session and configuration of a worker process
+
+
+def saved_results(src: str) -> Iterator[Tuple[str, str]]:
+    """Saved results in a file, a directory, or an archive.
+
+    Arguments:
+        src: JSON file, directory, zip archive, or tar archive.
+
+    Returns:
+        Pairs of member name and JSON text, in name order.
+    """
+    if src.endswith('.json') and os.path.isfile(src):
+        with open(src) as fl:
+            yield src, fl.read()
+    elif os.path.isdir(src):
+        for fn in sorted(str(p) for p in Path(src).rglob('*.json')):
+            with open(fn) as fl:
+                yield fn, fl.read()
+    elif zipfile.is_zipfile(src):
+        with zipfile.ZipFile(src) as zf:
+            for name in sorted(n for n in zf.namelist()
+                               if n.endswith('.json')):
+                yield name, zf.read(name).decode()
+    elif tarfile.is_tarfile(src):
+        with tarfile.open(src) as tf:
+            for member in sorted((m for m in tf.getmembers() if m.isfile()
+                                  and m.name.endswith('.json')),
+                                 key=lambda m: m.name):
+                yield member.name, tf.extractfile(member).read().decode()
+    else:
+        raise ValueError(f'not a directory or archive: {src}')
+
+
+def load_saved(name: str, text: str) -> Optional[Result]:
+    """Rebuild a saved result.
+
+    Arguments:
+        name: file or member name of the saved result.
+        text: JSON text of the saved result.
+
+    Returns:
+        The result, or None if text is not an analysis result.
+    """
+    try:
+        data = json.loads(text)
+        return Result(data.get('input_file', name)).reconstruct(data)
+    except (ValueError, KeyError, AttributeError, TypeError):
+        logger.warning(f'Not a saved result: {name}')
+        return None
+
+
+def verdicts(result: Result) -> dict:
+    """Verdicts of all methods of a result.
+
+    Returns:
+        Verdicts keyed by (method, policy), where policy is None
+        for the verdict of the method constraints.
+    """
+    found = {}
+    for method in [m for c in result.analysis_result.values()
+                   for m in c.values() if m.ids]:
+        found[(method.full_name, None)] = method.sat
+        for policy, verdict in (method.policies or {}).items():
+            found[(method.full_name, policy)] = verdict
+    return found
+
+
+def reevaluate(item: Tuple[str, str], args: Namespace) -> List[CHANGE_T]:
+    """Evaluate one saved result again.
+
+    This is a module-level function, so that it can be
+    dispatched to worker processes.
+
+    Arguments:
+        item: member name and JSON text of a saved result.
+        args: parsed command arguments.
+
+    Returns:
+        The changed verdicts.
+    """
+    from .evaluate import Evaluate, Z3Session
+    name, text = item
+    if (result := load_saved(name, text)) is None:
+        return []
+    before = verdicts(result)
+    for method in [m for c in result.analysis_result.values()
+                   for m in c.values()]:
+        method.pop('policies', None)
+        method.pop('violations', None)
+    if (session := __SESSION.get('z3')) is None:
+        session = __SESSION['z3'] = Z3Session(smtlib=False)
+    lattice, policies = __config(args)
+    Evaluate(result, args.solver, False, args.reduce, None,
+             args.timeout, None, policies, session, lattice).solve_all()
+    after = verdicts(result)
+    return [(name, m, p, before.get((m, p)), after.get((m, p)))
+            for m, p in sorted(before.keys() | after.keys(),
+                               key=lambda k: (k[0], k[1] or ''))
+            if before.get((m, p)) != after.get((m, p))]
+
+
+def __config(args: Namespace) -> tuple:
+    """Lattice and policies of a worker process, loaded once."""
+    from .lattice import Lattice
+    from .policy import Policy
+    key = (args.lattice, args.policy)
+    if (known := __SESSION.get('config')) is None or known[0] != key:
+        lattice = Lattice.load(args.lattice) if args.lattice else None
+        policies = Policy.load(args.policy, lattice) \
+            if args.policy else None
+        __SESSION['config'] = known = (key, lattice, policies)
+    return known[1:]
+
+
+def run(args: Namespace) -> List[CHANGE_T]:
+    """Re-evaluate all saved results of a directory or archive.
+
+    Results are read lazily, and at most a few per worker are
+    in flight, so large corpora are streamed.
+
+    Arguments:
+        args: parsed command arguments.
+
+    Returns:
+        All changed verdicts, in result name order.
+    """
+    items, changes = saved_results(args.input), []
+    if args.jobs <= 1:
+        for item in items:
+            changes += __report(reevaluate(item, args))
+        return changes
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(reevaluate, item, args))
+            if len(pending) >= 4 * args.jobs:
+                changes += __report(pending.popleft().result())
+        while pending:  # in submission order => deterministic output
+            changes += __report(pending.popleft().result())
+    return changes
+
+
+def __report(changes: List[CHANGE_T]) -> List[CHANGE_T]:
+    """Print changed verdicts, one per line."""
+    for name, method, policy, old, new in changes:
+        print(f'{name}\t{method}\t{policy or "-"}\t'
+              f'{old or "-"} → {new or "-"}')
+    return changes
+
+
+def main() -> List[CHANGE_T]:
+    """Command-line interface of bulk re-evaluation."""
+    parser = ArgumentParser(
+        prog='analysis.reeval',
+        description='re-evaluate saved results, and show changed '
+                    'verdicts\n(file, method, policy, old → new)',
+        formatter_class=RawTextHelpFormatter)
+    parser.add_argument(
+        'input',
+        help='directory or archive (zip, tar) of saved results')
+    parser.add_argument(
+        '-s', '--solver',
+        choices=['z3', 'native', 'check'],
+        default='z3',
+        help='constraint solver (default: z3)',
+        type=str.lower)
+    parser.add_argument(
+        '--policy',
+        help='check methods against the security policies in FILE',
+        metavar='FILE')
+    parser.add_argument(
+        '--lattice',
+        help='policy levels are elements of the lattice in FILE\n'
+             '(requires --policy)',
+        metavar='FILE')
+    parser.add_argument(
+        '--reduce',
+        nargs='?',
+        const='scc',
+        choices=['scc', 'interface'],
+        help='reduce constraints before solving (default: scc)',
+        metavar='MODE')
+    parser.add_argument(
+        '--timeout',
+        help='evaluation time limit per method',
+        metavar='SEC',
+        type=float)
+    parser.add_argument(
+        '-j', '--jobs',
+        default=1,
+        help='number of parallel worker processes (default: 1)',
+        metavar='N',
+        type=int)
+    parser.add_argument(
+        '-o', '--out',
+        help='also write changed verdicts to FILE (JSON)',
+        metavar='FILE')
+    args = parser.parse_args()
+    if args.lattice and not args.policy:
+        parser.error('--lattice requires --policy')
+    logging.basicConfig(level=logging.ERROR)
+    if args.policy:
+        from .lattice import Lattice
+        from .policy import Policy
+        try:
+            Policy.load(args.policy, args.lattice and
+                        Lattice.load(args.lattice))
+        except (OSError, ValueError) as e:
+            logger.fatal(f'Invalid policy file: {e}')
+            sys.exit(1)
+    try:
+        changes = run(args)
+    except ValueError as e:
+        logger.fatal(str(e))
+        sys.exit(1)
+    if args.out:
+        utils.ensure_path(args.out)
+        with open(args.out, 'w') as fl:
+            json.dump([dict(zip(('file', 'method', 'policy', 'old', 'new'),
+                                c)) for c in changes], fl, indent=4)
+    return changes
+
+
+if __name__ == '__main__':
+    main()
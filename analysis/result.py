@@ -4,9 +4,10 @@ import json
 import logging
 import time
 from types import SimpleNamespace
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict
 
 from . import Colors, utils
+from .graph import closure
 
 logger = logging.getLogger(__name__)
 
@@ -34,8 +35,11 @@ class DirResult:
         self.stats_skip = dict()
         self.stats_full_files = []
         self.stats_none_files = []
+        self.stats_failed_files = []
         self.stats_full_methods = 0
         self.stats_methods = 0
+        self.stats_parse_modes = dict()
+        self.stats_cache = dict()
         Result.config_printer(printer)
 
     @property
@@ -56,7 +60,13 @@ class DirResult:
                 f" {self.progress:.0%}")
 
     def record(self, result: Result):
-        ar = result.analysis_result
+        if error := result.error:
+            self.stats_failed_files.append((result.infile, error))
+            self.results += 1
+            if PRINTER.PRETTY:
+                print(f'Failed: {error["category"]}\n{self.progress_str}')
+            return
+        ar = result.get(Result.AR, AnalysisResult())
         mth, full_m = 0, 0
         for cls in ar.children():
             for m in ar.children_of(cls):
@@ -72,6 +82,12 @@ class DirResult:
             target = self.stats_full_files \
                 if mth > 0 else self.stats_none_files
             target.append(result.infile)
+        if outcome := result.cache:
+            self.stats_cache[outcome] = \
+                self.stats_cache.get(outcome, 0) + 1
+        if mode := result.parse_mode:
+            self.stats_parse_modes[mode] = \
+                self.stats_parse_modes.get(mode, 0) + 1
         self.stats_methods += mth
         self.stats_full_methods += full_m
         self.results += 1
@@ -88,20 +104,37 @@ class DirResult:
         """Show aggregate stats for whole-directory."""
         if PRINTER.PRETTY:
             nsp = '\n  '
+            failed = self.stats_failed_files
             partial = (self.n - len(self.stats_none_files) -
-                       len(self.stats_full_files))
+                       len(self.stats_full_files) - len(failed))
             print(AnalysisResult.SEP[1:] +
                   f"All files: {self.n}"
                   f"{nsp}{len(self.stats_full_files)} full cover"
                   f"{nsp}{partial} partial cover"
                   f"{nsp}{len(self.stats_none_files)} empty"
+                  f"{nsp}{len(failed)} failed" +
+                  ''.join([f"{nsp}{v} parsed in {k} mode" for k, v
+                           in sorted(self.stats_parse_modes.items())]) +
+                  (f"\nCache: {self.stats_cache.get('hit', 0)} hits, "
+                   f"{self.stats_cache.get('miss', 0)} misses"
+                   if self.stats_cache else "") +
                   f"\nAll methods: {self.stats_methods}"
                   f"{nsp}{self.stats_full_methods} full cover"
                   f"\nSKIPPED STATEMENTS (TOP 20){nsp}" +
                   nsp.join([f"{v}x {k}" for (v, k) in
-                            self.top_skips(20)]))
+                            self.top_skips(20)]) +
+                  (f"\nFAILED FILES{nsp}" + nsp.join(
+                      [f"{fn}{self.position(e)} {e['category']}: "
+                       f"{e['message']}" for fn, e in failed])
+                   if failed else ""))
         return self
 
+    @staticmethod
+    def position(error: dict) -> str:
+        """Position of an error, as `:line:column`, if known."""
+        return ''.join(f':{error[k]}' for k in ('line', 'column')
+                       if error.get(k) is not None)
+
 
 class Result(dict):
     AR = 'analysis_result'
@@ -148,13 +181,40 @@ class Result(dict):
         self.__setitem__('analyzer', analyzer)
 
     @property
-    def solver(self) -> str:
-        return self.__getitem__('solver')
+    def solver(self) -> Optional[str]:
+        return self.get('solver')
 
     @solver.setter
     def solver(self, solver):
         self.__setitem__('solver', solver)
 
+    @property
+    def parse_mode(self) -> Optional[str]:
+        return self.get('parse_mode')
+
+    @parse_mode.setter
+    def parse_mode(self, mode: str):
+        self.__setitem__('parse_mode', mode)
+
+    @property
+    def error(self) -> Optional[dict]:
+        """Why analysis of the file failed (category, message,
+        line, column), or None if it did not fail."""
+        return self.get('error')
+
+    @error.setter
+    def error(self, error: dict):
+        self.__setitem__('error', error)
+
+    @property
+    def cache(self) -> Optional[str]:
+        """Result cache outcome: hit, miss, or None if not cached."""
+        return self.get('cache')
+
+    @cache.setter
+    def cache(self, outcome: str):
+        self.__setitem__('cache', outcome)
+
     @property
     def analysis_result(self) -> ClassResult:
         return self.__getitem__(self.AR)
@@ -241,11 +301,16 @@ class Result(dict):
             u = self.analysis_result.un_cov
             un_cov = f'\n{u}' if u else ''
             res = [f'{self.DIV}\nRESULTS {fn}{un_cov}']
+            if err := self.error:
+                res.append(f'FAILED{DirResult.position(err)} '
+                           f'{err["category"]}: {err["message"]}')
             ar = str(self.analysis_result)
             if len(str(ar)):
                 res.append(ar)
             if PRINTER.TIME:
-                res.append(str(self.timers))
+                res.append(str(self.timers) + (
+                    '\n(cache hit: only loading was timed)'
+                    if self.cache == 'hit' else ''))
             print(f'{AnalysisResult.SEP.join(res)}')
         return self
 
@@ -336,7 +401,8 @@ class MethodResult(AnalysisResult):
                  flows: list[tuple[str, str]],
                  variables: set[str],
                  skips: List[str] = None,
-                 returns: set[str] = None):
+                 returns: set[str] = None,
+                 interface: set[str] = None):
         super().__init__()
         super().__setitem__('full_name', full_name)
         super().__setitem__('source', source)
@@ -347,6 +413,13 @@ class MethodResult(AnalysisResult):
         super().__setitem__('sat', None)
         super().__setitem__('model', None)
         super().__setitem__('smtlib', None)
+        super().__setitem__('interface', None if interface is None
+                            else sorted(interface))
+        # method cache bookkeeping, not saved
+        self.digest: Optional[str] = None  # cache key
+        self.names: List[str] = []  # identifier table
+        self.memo: Optional[dict] = None  # normalized entry
+        self.reused = False  # verdict came from cache
 
     @staticmethod
     def init(data):
@@ -370,6 +443,59 @@ class MethodResult(AnalysisResult):
     def returns(self) -> Tuple[str]:
         return tuple(self.__getitem__('return'))
 
+    @property
+    def interface(self) -> Optional[Tuple[str]]:
+        """Variables visible outside the method (parameters,
+        fields, returns), if known."""
+        ifc = self.get('interface')
+        return None if ifc is None else tuple(ifc)
+
+    @property
+    def reduction(self) -> Optional[dict]:
+        """Statistics and variable mapping of the constraint
+        reduction, if the method was solved reduced."""
+        return self.get('reduction')
+
+    @reduction.setter
+    def reduction(self, reduction: dict):
+        super().__setitem__('reduction', reduction)
+
+    @property
+    def reach(self) -> List[str]:
+        """Transitive closure of the flows: for each variable,
+        in `ids` order, the hex bitset of the variables that it
+        reaches (bit i for the i-th variable)."""
+        if self.get('reach') is None:
+            self.index()
+        return self.__getitem__('reach')
+
+    def index(self) -> MethodResult:
+        """Compute the reachability index of the flows, to be
+        saved with the result."""
+        vrs = self.ids
+        index = {v: i for i, v in enumerate(vrs)}
+        rows = closure(len(vrs), (
+            (index[a], index[b]) for a, b in self.flows))
+        super().__setitem__('reach', [f'{r:x}' for r in rows])
+        return self
+
+    def reaches(self, src: str, sink: str) -> bool:
+        """True if a variable flows, transitively, to another.
+
+        Arguments:
+            src: source variable.
+            sink: sink variable.
+        """
+        return sink in self.reachable(src)
+
+    def reachable(self, src: str) -> List[str]:
+        """Variables that a variable flows to, transitively."""
+        vrs, rows = self.ids, self.reach
+        if src not in vrs:
+            return []
+        bits = int(rows[vrs.index(src)], 16)
+        return [v for i, v in enumerate(vrs) if bits >> i & 1]
+
     @property
     def source(self) -> str:
         return self.__getitem__('source')
@@ -394,6 +520,53 @@ class MethodResult(AnalysisResult):
     def model(self, model):
         super().__setitem__('model', model)
 
+    @property
+    def policies(self) -> Optional[Dict[str, str]]:
+        """Verdict of each policy that applies to the method,
+        if policies were checked."""
+        return self.get('policies')
+
+    @policies.setter
+    def policies(self, verdicts: Dict[str, str]):
+        super().__setitem__('policies', verdicts)
+
+    @property
+    def violations(self) -> Optional[Dict[str, List[List[str]]]]:
+        """Shortest chains of flows from high to low variables,
+        for each violated policy."""
+        return self.get('violations')
+
+    @violations.setter
+    def violations(self, chains: Dict[str, List[List[str]]]):
+        super().__setitem__('violations', chains)
+
+    @property
+    def timing(self) -> Dict[str, float]:
+        """Time spent on the method in each phase (analysis,
+        solve, policies), in milliseconds."""
+        return self.get('timing') or {}
+
+    def timed(self, phase: str, start: int) -> MethodResult:
+        """Record the time spent on the method in a phase.
+
+        Arguments:
+            phase: name of the phase.
+            start: start time of the phase, nanoseconds, by
+                `time.perf_counter_ns`.
+        """
+        ms = (time.perf_counter_ns() - start) / 1e6
+        super().__setitem__('timing', {**self.timing, phase: round(ms, 4)})
+        return self
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        """Seconds spent before evaluation gave up, if it did."""
+        return self.get('elapsed')
+
+    @elapsed.setter
+    def elapsed(self, seconds: float):
+        super().__setitem__('elapsed', round(seconds, 4))
+
     @property
     def smtlib(self) -> str:
         return self.__getitem__('smtlib')
@@ -474,11 +647,21 @@ class MethodResult(AnalysisResult):
         skips = (f'\n{"SKIPS:":<{self.PAD}}'
                  f'{self.join_(self.pretty_skips)}'
                  if self.skips else "")
+        gave_up = f' (after {self.elapsed} sec)' \
+            if self.elapsed is not None else ''
+        policies = (f'\n{"POLICIES:":<{self.PAD}}' + self.join_(
+            [f'{p}={v}' for p, v in self.policies.items()])
+            if self.policies else '')
+        chains = [f'{p}: {self.FLOW.join(c)}' for p, cs in
+                  (self.violations or {}).items() for c in cs]
+        violates = (f'\n{"VIOLATES:":<{self.PAD}}' +
+                    f'\n{" " * self.PAD}'.join(chains) if chains else '')
         return (f'{"METHOD:":<{self.PAD}}{name}\n{source}'
                 f'{"VARS:":<{self.PAD}}{vars_}\n'
                 f'{"RETURN:":<{self.PAD}}{rets_}\n'
                 f'{"FLOWS:":<{self.PAD}}{flows}\n'
-                f'{"MODEL:":<{self.PAD}}{self.sat}{m_vals}{skips}')
+                f'{"MODEL:":<{self.PAD}}{self.sat}{gave_up}{m_vals}'
+                f'{policies}{violates}{skips}')
 
 
 class Timers(dict):
@@ -487,6 +670,7 @@ class Timers(dict):
     def __init__(self):
         """Create all timers."""
         super().__init__()
+        self.lex = Timeable(self, 'Lexing')
         self.parse = Timeable(self, 'Parsing')
         self.analysis = Timeable(self, 'Analysis')
         self.eval = Timeable(self, 'Evaluation')
@@ -506,9 +690,11 @@ class Timers(dict):
 class Timeable(dict):
     """Abstract structure to track execution time.
 
-    Internally it uses the Python standard library "time",
-    and measure time in nanoseconds by UTC timestamp.
-    Caller is responsible for starting and stopping timer.
+    Internally it uses the Python standard library "time", and
+    measures time in nanoseconds by a monotonic clock, and the
+    CPU time of the process (all threads), which excludes time
+    spent waiting. Caller is responsible for starting and
+    stopping timer.
     """
 
     def __init__(self, parent: dict, name: str):
@@ -542,17 +728,29 @@ class Timeable(dict):
 
     def start(self) -> Timeable:
         """Start timer."""
-        self.__setitem__('start', time.time_ns())
+        self.__setitem__('start', time.perf_counter_ns())
+        self.__setitem__('cpu_start', time.process_time_ns())
         return self
 
     def stop(self) -> Timeable:
         """Stop timer."""
-        end = time.time_ns()
+        end, cpu = time.perf_counter_ns(), time.process_time_ns()
         self.__setitem__('ms', self.diff(self.t0, end, 1e6))
         self.__setitem__('sec', self.diff(self.t0, end, 1e9))
+        self.__setitem__('cpu_sec', self.diff(self['cpu_start'], cpu, 1e9))
         self.__setitem__('end', end)
         return self
 
+    def add_work(self, ns: int) -> Timeable:
+        """Add time spent by workers, e.g., when the timed
+        work runs in parallel.
+
+        Arguments:
+            ns: worker time, nanoseconds
+        """
+        self.__setitem__('work_sec', self.get('work_sec', 0) + ns / 1e9)
+        return self
+
     @staticmethod
     def diff(start: float, end: float, units: float) -> float:
         """Get time difference between start and end times.
@@ -565,6 +763,10 @@ class Timeable(dict):
         return (end - start) / units
 
     def __str__(self) -> str:
+        cpu = f' ({round(self["cpu_sec"], 4)} sec cpu)' \
+            if 'cpu_sec' in self else ''
+        work = f' ({round(self["work_sec"], 4)} sec work)' \
+            if 'work_sec' in self else ''
         return (f'{self.name:<16} ' +
                 (f'{self.t_sec:>10} sec' if self.finished
-                 else f'{"-":>14}'))
+                 else f'{"-":>14}') + cpu + work)
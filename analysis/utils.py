@@ -1,3 +1,4 @@
+import hashlib
 import os
 import re
 from typing import Any
@@ -79,6 +80,23 @@ def log_filename(in_str: str, out_dir) -> str:
     return gen_filename(in_str, out_dir or 'out', depth=3, ext='log')
 
 
+def digest(*files: str) -> str:
+    """Hash the content of one or more files.
+
+    Arguments:
+        files: file paths; non-existent files are skipped.
+
+    Returns:
+        A hex digest of the combined file contents.
+    """
+    sha = hashlib.sha256()
+    for fn in files:
+        if fn and os.path.isfile(fn):
+            with open(fn, 'rb') as fl:
+                sha.update(fl.read())
+    return sha.hexdigest()
+
+
 def rem_ws(txt: str) -> str:
     """Remove whitespace from text."""
     return re.sub('\\s+', " ", txt)
@@ -4,7 +4,7 @@ import os
 from pytest import raises
 
 from analysis import Result, utils
-from analysis.analyzer import BaseVisitor
+from analysis.analyzer import BaseVisitor, NameTable, FlowMatrix
 from analysis.utils import Bcolors as Colors
 
 
@@ -38,6 +38,28 @@ def test_gen_rename():
     assert thr == 'a₆'
 
 
+def test_fresh_names_per_base():
+    names = NameTable()
+    a, b = names.intern('a'), names.intern('b')
+    names.intern('a₃')
+    fresh = [names.name(names.fresh(a)) for _ in range(3)]
+    assert fresh == ['a₂', 'a₄', 'a₅']
+    assert names.name(names.fresh(b, 0)) == 'b₀'
+    assert names.intern('a₂') == names.ids['a₂']
+    assert len(names) == 7
+
+
+def test_flow_matrix_dedup():
+    m1, m2 = FlowMatrix(), FlowMatrix()
+    m1.add({0, 1}, {1, 2})
+    m1.add({0}, {2})
+    m2.add({3}, {0})
+    m1 |= m2
+    assert sorted(m1) == [(0, 1), (0, 2), (1, 2), (3, 0)]
+    assert len(m1) == 4
+    assert sorted(m1.renamed({0: 4})) == [(1, 2), (3, 4), (4, 1), (4, 2)]
+
+
 def test_save(mocker):
     # mock all built-ins
     mocker.patch('os.path.exists', return_value=False)
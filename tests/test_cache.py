@@ -0,0 +1,94 @@
+import os
+from collections import OrderedDict
+
+from analysis import Result
+from analysis.cache import MethodCache, ResultCache, ShapeCache
+
+
+def make_cache(tmp_path, **kwargs):
+    src = tmp_path / 'Program.java'
+    src.write_text('class Program {}')
+    return ResultCache(str(tmp_path / 'cache'), **kwargs), str(src)
+
+
+def test_cache_miss_then_hit(tmp_path):
+    cache, src = make_cache(tmp_path)
+    key = cache.key(src, solver='Z3')
+    assert cache.get(key) is None
+    cache.put(key, Result(src))
+    assert cache.get(key)['input_file'] == src
+
+
+def test_cache_key_depends_on_config(tmp_path):
+    cache, src = make_cache(tmp_path)
+    assert cache.key(src, solver='Z3 4.13') != \
+           cache.key(src, solver='Z3 4.12')
+    assert cache.key(src, run='A', solver='x') == \
+           cache.key(src, solver='x', run='A')
+
+
+def test_cache_key_depends_on_content(tmp_path):
+    cache, src = make_cache(tmp_path)
+    before = cache.key(src)
+    with open(src, 'a') as fl:
+        fl.write('\n// edit')
+    assert cache.key(src) != before
+
+
+def test_cache_fast_path_skips_read(tmp_path, mocker):
+    cache, src = make_cache(tmp_path)
+    key = cache.key(src)
+    spy = mocker.patch('analysis.utils.digest')
+    assert cache.key(src) == key
+    spy.assert_not_called()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache, src = make_cache(tmp_path, max_mb=0)
+    keys = [cache.key(src, n=n) for n in range(3)]
+    for n, key in enumerate(keys):
+        cache.put(key, {'data': 'x' * 100})
+        os.utime(cache.entry(key), ns=(n, n))
+    stats = tmp_path / 'cache' / ResultCache.STATS
+    [stat] = stats.iterdir()
+    cache.max_bytes = 250 + stat.stat().st_size
+    cache.get(keys[0])  # now most recently used
+    assert cache.evict() == 1
+    assert cache.get(keys[0]) and cache.get(keys[2])
+    assert cache.get(keys[1]) is None
+    assert stat.exists()
+
+
+def test_caches_share_size_limit(tmp_path):
+    cache, src = make_cache(tmp_path)
+    path = str(tmp_path / 'cache')
+    cache.put(cache.key(src), {'data': 'x' * 100})
+    MethodCache(path).put('m', {'data': 'x' * 100})
+    ShapeCache(path).put('s', {'data': 'x' * 100})
+    files = sorted(p for p in (tmp_path / 'cache').rglob('*')
+                   if p.is_file())
+    assert len(files) == 4  # three entries, and a file stat
+    for n, fn in enumerate(files):
+        os.utime(fn, ns=(n, n))
+    # each cache alone fits, together they do not
+    cache.max_bytes = sum(fn.stat().st_size for fn in files[2:])
+    assert cache.evict() == 2
+    assert [fn.exists() for fn in files] == [False, False, True, True]
+
+
+def test_shape_cache_is_bounded(mocker):
+    mocker.patch.object(ShapeCache, 'MEMO', OrderedDict())
+    cache = ShapeCache(max_entries=2)
+    for key in 'abc':
+        cache.put(key, {'sat': 'SAT'})
+        cache.get('a')  # keep a recently used
+    assert list(cache.memo) == ['c', 'a']
+
+
+def test_method_cache_is_bounded(mocker):
+    mocker.patch.object(MethodCache, 'MEMO', OrderedDict())
+    cache = MethodCache(max_entries=2)
+    for key in 'abc':
+        cache.put(key, {'flows': []})
+        cache.get('a')  # keep a recently used
+    assert list(cache.memo) == ['c', 'a']
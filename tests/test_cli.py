@@ -1,3 +1,4 @@
+import json
 from types import SimpleNamespace
 from typing import Optional
 
@@ -11,7 +12,8 @@ from analysis.analyzer import JavaAnalyzer, JsonLoader
 
 class MockAnalyzer(AbstractAnalyzer):
 
-    def parse(self, t: Optional[Timeable] = None):
+    def parse(self, t: Optional[Timeable] = None,
+              lex: Optional[Timeable] = None):
         return self
 
     def analyze(self, t: Optional[Timeable] = None):
@@ -22,7 +24,13 @@ class MockAnalyzer(AbstractAnalyzer):
 def parse_args(**kwargs):
     default = {'input': None, 'out': None,
                'run': 'E', 'save': False, 'print': '',
-               'log': False, 'log_level': 4}
+               'log': False, 'log_level': 4, 'jobs': 1,
+               'exclude': None, 'dfa': None, 'cache': None,
+               'cache_size': 256, 'solver': 'z3',
+               'eval_jobs': 1, 'smtlib': None, 'reduce': None,
+               'memo': None, 'timeout': None, 'budget': None,
+               'policy': None, 'query': None, 'lattice': None,
+               'method': None, 'profile_grammar': None}
     return SimpleNamespace(**dict({**default, **kwargs}))
 
 
@@ -83,3 +91,148 @@ def test_printer_options(mocker):
     printer = __main__.main().printer()
     assert printer.PRETTY is False
     assert printer.CODE is False
+
+
+def test_parallel_dir_matches_serial(mocker):
+    def dir_run(jobs):
+        mocker.patch('analysis.__main__.__parse_args',
+                     return_value=parse_args(
+                         input='programs', run='A', print='0',
+                         log_level=0, jobs=jobs))
+        return __main__.main()
+
+    serial, parallel = dir_run(1), dir_run(2)
+    assert serial.results == parallel.results == serial.files
+    assert serial.stats_skip == parallel.stats_skip
+    assert serial.stats_full_files == parallel.stats_full_files
+    assert serial.stats_none_files == parallel.stats_none_files
+    assert serial.stats_methods == parallel.stats_methods
+    assert serial.stats_full_methods == parallel.stats_full_methods
+
+
+def test_cached_result_is_reused(mocker, tmp_path):
+    mocker.patch('analysis.__main__.__parse_args',
+                 return_value=parse_args(
+                     input='programs/ifcprog1/Program.java', print='0',
+                     log_level=0, cache=str(tmp_path)))
+    first = __main__.main()
+    spy = mocker.spy(JavaAnalyzer, 'parse')
+    second = __main__.main()
+    spy.assert_not_called()
+    assert (first.cache, second.cache) == ('miss', 'hit')
+    # flows reload as lists, as with JsonLoader
+    saved = json.loads(json.dumps(first.analysis_result))
+    assert saved['Program']['example'].pop('timing')
+    assert 'timing' not in second.analysis_result['Program']['example']
+    for method in saved['Program'].values():
+        method.pop('timing', None)
+    assert saved == second.analysis_result
+    assert second.timers.total.finished
+
+
+def test_smtlib_only_when_requested(mocker, tmp_path):
+    def run(**kwargs):
+        mocker.patch('analysis.__main__.__parse_args',
+                     return_value=parse_args(
+                         input='programs/ifcprog1/Program.java',
+                         print='0', log_level=0, **kwargs))
+        return __main__.main().analysis_result['Program']['example']
+
+    assert run().smtlib is None
+    assert run(smtlib=True).smtlib.startswith('(declare-fun')
+    side = tmp_path / 'out.smt2'
+    assert run(smtlib=str(side)).smtlib is None
+    script = side.read_text()
+    assert '; Program.example\n(push)\n(declare-fun' in script
+    assert script.count('(check-sat)') == script.count('(pop)') == 1
+
+
+def test_smtlib_kept_for_cached_methods(mocker, tmp_path):
+    src, out = tmp_path / 'Program.java', tmp_path / 'result.json'
+    prog = open('programs/ifcprog1/Program.java').read()
+
+    def run(text, smtlib):
+        src.write_text(text)
+        mocker.patch('analysis.__main__.__parse_args',
+                     return_value=parse_args(
+                         input=str(src), out=str(out), print='0',
+                         log_level=0, cache=str(tmp_path / 'cache'),
+                         reduce='scc', smtlib=smtlib))
+        return __main__.main().analysis_result['Program']['example']
+
+    first = run(prog, str(tmp_path / 'a.smt2'))
+    # comment-only edits: file cache misses, method cache hits
+    second = run('// edited\n' + prog, str(tmp_path / 'b.smt2'))
+    assert second.reused and not first.reused
+    script = (tmp_path / 'b.smt2').read_text()
+    assert script == (tmp_path / 'a.smt2').read_text()
+    assert '; Program.example\n(push)\n(declare-fun' in script
+    assert second.reduction == first.reduction is not None
+    third = run('// again\n' + prog, True)
+    saved = json.loads(out.read_text())['analysis_result']['Program']
+    assert third.reused and saved['example']['smtlib'].startswith(
+        '(declare-fun')
+    assert 'solve' in saved['example']['timing']
+
+
+def test_dir_run_continues_after_failures(mocker, tmp_path):
+    from analysis.analyzer.java import RecVisitor
+    ok = open('programs/ifcprog1/Program.java').read()
+    (tmp_path / 'a.java').write_text(ok)
+    (tmp_path / 'b.java').write_text('class B {\n  void f() { int x = ; }\n}')
+    (tmp_path / 'c.java').write_text(ok.replace('example', 'boom'))
+    visit = RecVisitor.visit
+
+    def crash(self, tree):
+        if 'boom' in tree.parentCtx.getText():
+            raise RuntimeError('boom')
+        return visit(self, tree)
+
+    mocker.patch.object(RecVisitor, 'visit', crash)
+    mocker.patch('analysis.__main__.__parse_args', return_value=parse_args(
+        input=str(tmp_path), run='A', print='0', log_level=0))
+    res = __main__.main()
+    assert res.results == res.files == 3
+    failed = dict(res.stats_failed_files)
+    assert sorted(failed) == [str(tmp_path / f) for f in ('b.java', 'c.java')]
+    syntax = failed[str(tmp_path / 'b.java')]
+    assert (syntax['category'], syntax['line'], syntax['column']) == \
+        ('syntax', 2, 21)
+    assert syntax['message'].startswith("mismatched input ';'")
+    boom = failed[str(tmp_path / 'c.java')]
+    assert boom['category'] == 'analysis' and 'boom' in boom['message']
+    assert boom['line'] == 6
+
+
+def test_bench_skips_failing_files(tmp_path):
+    from analysis import bench
+    ok = open('programs/ifcprog1/Program.java').read()
+    (tmp_path / 'a.java').write_text(ok)
+    (tmp_path / 'b.java').write_text('class B {\n  void f() { int x = ; }\n}')
+    methods = bench.collect([str(tmp_path)])
+    assert methods and all(m.ids for m in methods)
+
+
+def test_policies_loaded_once_per_run(mocker, tmp_path):
+    from analysis.lattice import Lattice
+    from analysis.policy import Policy
+    for prog in ('ifcex1', 'ifcprog1'):
+        (tmp_path / f'{prog}.java').write_text(
+            open(f'programs/{prog}/Program.java').read())
+    (fn := tmp_path / 'policy.txt').write_text(json.dumps([
+        {'name': 'x-low', 'levels': {'x': 'low'}}]))
+    (lat := tmp_path / 'lattice.txt').write_text(json.dumps({
+        'elements': ['low', 'high'], 'order': [['low', 'high']]}))
+    spy, lat_spy = mocker.spy(Policy, 'load'), mocker.spy(Lattice, 'load')
+    mocker.patch('analysis.__main__.__parse_args', return_value=parse_args(
+        input=str(tmp_path), print='0', log_level=0, policy=str(fn),
+        lattice=str(lat)))
+    res = __main__.main()
+    assert res.files == 2 and spy.call_count == lat_spy.call_count == 1
+
+
+def test_lattice_requires_policy(mocker):
+    mocker.patch('analysis.__main__.__parse_args', return_value=parse_args(
+        input='programs/ifcex1/Program.java', lattice='lattice.json'))
+    with raises(SystemExit):
+        __main__.main()
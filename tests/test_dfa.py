@@ -0,0 +1,64 @@
+import json
+
+from antlr4 import PredictionContextCache
+from antlr4.dfa.DFA import DFA
+from pytest import fixture
+
+from analysis import Result
+from analysis.analyzer import JavaAnalyzer
+from analysis.analyzer.dfa import DfaCache
+from analysis.parser import JavaParser
+
+
+def cold_parser(monkeypatch):
+    """Replace the parser DFA by empty DFA (restored after test)."""
+    atn = JavaParser.atn
+    monkeypatch.setattr(JavaParser, 'decisionsToDFA', [
+        DFA(ds, i) for i, ds in enumerate(atn.decisionToState)])
+    monkeypatch.setattr(
+        JavaParser, 'sharedContextCache', PredictionContextCache())
+
+
+def parse_tree(prog):
+    analyzer = JavaAnalyzer(Result(f'programs/{prog}/Program.java'))
+    tree = analyzer.parse().tree
+    return tree.toStringTree(recog=JavaParser)
+
+
+@fixture
+def warm_cache(monkeypatch, tmp_path):
+    cold_parser(monkeypatch)
+    cache = DfaCache(str(tmp_path / 'java.dfa'))
+    tree = parse_tree('tm')
+    assert cache.save()
+    return cache, tree
+
+
+def test_dfa_reload_restores_states(monkeypatch, warm_cache):
+    cache, tree = warm_cache
+    n_states = cache.n_states
+    cold_parser(monkeypatch)
+    assert cache.n_states == 0
+    assert cache.load()
+    assert cache.n_states == n_states
+    assert parse_tree('tm') == tree
+    # nothing new was learned => nothing to write
+    assert cache.n_states == n_states
+    assert not cache.save()
+
+
+def test_dfa_load_only_into_cold_parser(warm_cache):
+    cache, _ = warm_cache
+    assert not cache.load()
+
+
+def test_dfa_grammar_mismatch_is_ignored(monkeypatch, warm_cache):
+    cache, _ = warm_cache
+    with open(cache.path) as fl:
+        data = json.load(fl)
+    data['fingerprint'] = 'stale'
+    with open(cache.path, 'w') as fl:
+        json.dump(data, fl)
+    cold_parser(monkeypatch)
+    assert not cache.load()
+    assert cache.n_states == 0
@@ -0,0 +1,166 @@
+import json
+import random
+from collections import OrderedDict
+
+from analysis import Evaluate, MethodResult, Result, AnalysisResult, \
+    ClassResult
+from analysis.cache import ShapeCache
+from analysis.evaluate import Z3Session
+from analysis.reduction import Reduction
+from analysis.graph import scc, successors, least_levels, \
+    shortest_paths, closure
+
+
+def test_scc_topological_order():
+    #  0 → 1 ⇄ 2 → 3
+    comps = scc(successors(4, [(0, 1), (1, 2), (2, 1), (2, 3)]))
+    assert [sorted(c) for c in comps] == [[0], [1, 2], [3]]
+
+
+def test_least_levels_propagate():
+    edges = [(0, 1), (1, 2), (2, 1), (3, 2)]
+    assert least_levels(4, edges, {}) == [0, 0, 0, 0]
+    assert least_levels(4, edges, {0: 2}) == [2, 2, 2, 0]
+    assert least_levels(4, edges, {0: 2, 2: 2}) == [2, 2, 2, 0]
+    assert least_levels(4, edges, {0: 2, 1: 1}) is None
+    assert least_levels(4, edges, {1: 1, 2: 2}) is None
+    assert least_levels(4, edges, {3: -1}) is None
+
+
+def test_native_solver_agrees_with_z3():
+    rnd = random.Random(7)
+    for _ in range(30):
+        vrs = [f'v{i}' for i in range(rnd.randint(1, 8))]
+        flows = [tuple(rnd.sample(vrs, 2)) for _ in
+                 range(rnd.randint(0, 10)) if len(vrs) > 1]
+        levels = {v: rnd.randint(0, 2) for v in
+                  rnd.sample(vrs, rnd.randint(0, min(3, len(vrs))))}
+        native, z3 = [MethodResult('m', '', flows, vrs)
+                      for _ in range(2)]
+        Evaluate.solve_native(native, **levels)
+        Evaluate.solve(z3, **levels)
+        assert native.sat == z3.sat
+        # native model is a solution, and it is least
+        if native.sat == 'SAT':
+            checked = MethodResult('m', '', flows, vrs)
+            Evaluate.check(checked, **levels)
+            assert checked.model == native.model
+            least, other = [dict(
+                (v, int(k)) for v, k in (a[2:].split(')=') for a in
+                                         model.split(', ')))
+                for model in (native.model, z3.model)]
+            assert all(least[v] <= other[v] for v in other)
+
+
+def test_z3_session_isolates_methods():
+    session = Z3Session()
+    unsat = MethodResult('m', '', [('a', 'b')], ['a', 'b'])
+    Evaluate.solve(unsat, session, a=1, b=0)
+    sat = MethodResult('n', '', [('b', 'a')], ['a', 'b'])
+    Evaluate.solve(sat, session, a=1)
+    assert (unsat.sat, sat.sat) == ('UNSAT', 'SAT')
+    assert sorted(sat.model.split(', ')) == ['l(a)=1', 'l(b)=0']
+    assert '(assert (<= |l(b)| |l(a)|))' in sat.smtlib
+    assert '|l(a)| |l(b)|' not in sat.smtlib
+
+
+def test_reduction_preserves_solutions():
+    rnd = random.Random(13)
+    for _ in range(50):
+        vrs = [f'v{i}' for i in range(rnd.randint(2, 10))]
+        flows = list({tuple(rnd.sample(vrs, 2))
+                      for _ in range(rnd.randint(0, 15))})
+        ifc = set(rnd.sample(vrs, rnd.randint(0, len(vrs))))
+        method = MethodResult('m', '', flows, vrs, interface=ifc)
+        for mode in Reduction.MODES:
+            red = Reduction(method, mode)
+            assert len(red.ids) <= len(vrs)
+            assert set(red.ids).isdisjoint(red.mapping)
+            assert set(red.ids) | set(red.mapping) == set(vrs)
+            proxy = red.reduced()
+            Evaluate.solve_native(proxy)
+            model = dict((v, int(k)) for v, k in
+                         Reduction.LEVEL.findall(red.expand(proxy.model)))
+            assert sorted(model) == sorted(vrs)
+            assert all(model[a] <= model[b] for a, b in flows)
+
+
+def test_reduction_collapses_cycles():
+    flows = [('a', 'b'), ('b', 'a'), ('b', 't'), ('t', 'c')]
+    method = MethodResult('m', '', flows, ['a', 'b', 't', 'c', 'u'],
+                          interface={'a', 'c'})
+    scc = Reduction(method)
+    assert scc.ids == ['a', 't', 'c']
+    assert scc.mapping == {'b': ['a'], 'u': []}
+    ifc = Reduction(method, Reduction.INTERFACE)
+    assert ifc.ids == ['a', 'c'] and ifc.flows == [('a', 'c')]
+    assert ifc.mapping['t'] == ['a']
+    assert ifc.expand('l(c)=2, l(a)=1') == \
+           'l(a)=1, l(b)=1, l(t)=1, l(c)=2, l(u)=0'
+
+
+def test_memo_reuses_renamed_shape(mocker):
+    mocker.patch.object(ShapeCache, 'MEMO', OrderedDict())
+    m = MethodResult('C.m', '', [('a', 'b'), ('b', 'c')], ['a', 'b', 'c'])
+    n = MethodResult('C.n', '', [('y', 'z'), ('x', 'y')], ['z', 'x', 'y'])
+    res = Result('C.java')
+    res.analysis_result = AnalysisResult()
+    res.analysis_result['C'] = ClassResult('C', {'m': m, 'n': n})
+    spy = mocker.spy(Evaluate, 'solve')
+    Evaluate(res, memo=ShapeCache()).solve_all()
+    assert spy.call_count == 1
+    assert n.sat == 'SAT' and n.model.startswith('l(z)=')
+    model = dict(Evaluate.MODEL.findall(n.model))
+    assert int(model['x']) <= int(model['y']) <= int(model['z'])
+    assert Evaluate.shape(m)[0] == Evaluate.shape(n)[0]
+    assert Evaluate.shape(m)[0] != Evaluate.shape(n, x=1)[0]
+
+
+def test_policies_checked_under_assumptions():
+    # a → b → c
+    method = MethodResult('C.m', '', [('a', 'b'), ('b', 'c')], ['a', 'b', 'c'])
+    policies = [{'a': 1, 'c': 0}, {'a': 0, 'c': 1}, {'b': 2}]
+    expected = ['UNSAT', 'SAT', 'SAT']
+    session = Z3Session()
+    for solver in ('z3', 'native', 'check'):
+        assert Evaluate.check_policies(
+            method, policies, session, solver) == expected
+    # scopes are popped: the session still solves other methods
+    Evaluate.solve(method, session, a=1)
+    assert method.sat == 'SAT'
+
+
+def test_violations_are_shortest_chains():
+    # a → b → c → d ← e, and a shortcut a → c
+    flows = [('a', 'b'), ('b', 'c'), ('c', 'd'), ('a', 'c'), ('e', 'd')]
+    method = MethodResult('C.m', '', flows, ['a', 'b', 'c', 'd', 'e'])
+    levels = {'a': 2, 'b': 0, 'd': 1, 'e': 0}
+    assert Evaluate.violations(method, levels) == [
+        ['a', 'b'], ['a', 'c', 'd']]
+    assert Evaluate.violations(method, {'a': 0, 'd': 1}) == []
+    assert shortest_paths(successors(3, [(0, 1)]), 0) == [0, 0, -1]
+
+
+def test_closure_matches_search():
+    rnd = random.Random(3)
+    for _ in range(20):
+        n = rnd.randint(1, 12)
+        edges = [(rnd.randrange(n), rnd.randrange(n))
+                 for _ in range(rnd.randint(0, 2 * n))]
+        edges = [(a, b) for a, b in edges if a != b]
+        succ, rows = successors(n, edges), closure(n, edges)
+        for v in range(n):
+            # reached by a non-empty path: from some successor
+            expected = {w for u in succ[v] for w, p in enumerate(
+                shortest_paths(succ, u)) if p >= 0}
+            assert {w for w in range(n) if rows[v] >> w & 1} == expected
+
+
+def test_method_reach_index():
+    method = MethodResult('C.m', '', [('a', 'b'), ('b', 'c'), ('c', 'b')],
+                          ['a', 'b', 'c', 'd'])
+    assert method.reaches('a', 'c') and method.reaches('c', 'c')
+    assert not method.reaches('c', 'a') and not method.reaches('a', 'a')
+    assert method.reachable('d') == [] and method.reachable('x') == []
+    assert MethodResult.init(json.loads(json.dumps(method))).reach == \
+        method.reach
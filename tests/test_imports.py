@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+from analysis import Result
+from analysis.analyzer import JavaAnalyzer
+
+Z3, PARSER = 'z3', 'analysis.parser.JavaParser'
+BUDGET = 0.4  # seconds, for importing the CLI
+
+
+def run_py(code):
+    """Run code in a fresh interpreter; returns its JSON output."""
+    out = subprocess.run([sys.executable, '-c', code], check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def loaded_after(cli_args):
+    return run_py(
+        'import json, sys\n'
+        'from analysis import __main__\n'
+        f'sys.argv = ["analysis"] + {cli_args!r}\n'
+        '__main__.main()\n'
+        f'print(json.dumps([m for m in {[Z3, PARSER]!r} '
+        'if m in sys.modules]))')
+
+
+def test_import_time_budget():
+    elapsed, loaded = run_py(
+        'import json, sys, time\n'
+        't0 = time.perf_counter()\n'
+        'import analysis.__main__\n'
+        'from analysis.analyzer import choose_analyzer\n'
+        'choose_analyzer("result.json")\n'
+        'elapsed = time.perf_counter() - t0\n'
+        f'print(json.dumps([elapsed, [m for m in {[Z3, PARSER]!r} '
+        'if m in sys.modules]]))')
+    assert loaded == []
+    assert elapsed < BUDGET
+
+
+def test_parse_only_does_not_load_solver():
+    loaded = loaded_after(
+        ['programs/ifcprog1/Program.java', '-r', 'P', '-p', '0'])
+    assert loaded == [PARSER]
+
+
+def test_json_reload_loads_neither(tmp_path):
+    res = Result('programs/ifcprog1/Program.java',
+                 str(tmp_path / 'result.json'))
+    JavaAnalyzer(res).parse().analyze()
+    res.save()
+    loaded = loaded_after([res.outfile, '-r', 'A', '-p', '0'])
+    assert loaded == []
@@ -1,5 +1,14 @@
-from analysis import Result
+import json
+from collections import OrderedDict
+
+from antlr4.error.Errors import ParseCancellationException
+
+from analysis import Result, Evaluate
 from analysis.analyzer import JavaAnalyzer
+from analysis.analyzer.java import RecVisitor
+from analysis.cache import MethodCache
+from analysis.parser import JavaParser
+from analysis.policy import Policy
 
 
 def helper(prog, cls_name, method):
@@ -142,3 +151,166 @@ def test_object_creation():
     assert ('MyClass₂', 'c') in flows
     assert len(flows) == 5
     assert not skips
+
+
+def test_sibling_allocations_share_name(tmp_path):
+    (src := tmp_path / 'Program.java').write_text(
+        """class Program { Object f(int p, int q, boolean c) {
+        Object o;
+        if (c) { o = new Foo(p); } else { o = new Foo(q); }
+        return o; } }""")
+    res = Result(str(src))
+    JavaAnalyzer(res).parse().analyze()
+    mth = res.analysis_result['Program']['f']
+    assert sorted(mth.flows) == [
+        ('Foo₀', 'o'), ('c', 'o'), ('p', 'Foo₀'), ('q', 'Foo₀')]
+
+
+def test_parses_in_sll_mode():
+    res = Result('programs/ifcprog1/Program.java')
+    JavaAnalyzer(res).parse()
+    assert res.parse_mode == 'SLL'
+
+
+def test_parse_falls_back_to_ll(mocker):
+    real, calls = JavaParser.compilationUnit, []
+
+    def fail_first(parser):
+        calls.append(parser._interp.predictionMode.name)
+        if len(calls) == 1:
+            raise ParseCancellationException('SLL')
+        return real(parser)
+
+    mocker.patch.object(JavaParser, 'compilationUnit', fail_first)
+    res = Result('programs/ifcprog1/Program.java')
+    JavaAnalyzer(res).parse().analyze()
+    assert calls == ['SLL', 'LL']
+    assert res.parse_mode == 'LL'
+    assert res.analysis_result['Program']['example'].flows
+
+
+PROG_A = """class A { int f(int a, int b) {
+    int x = a + b; // sum
+    if (x > 0) { x = b; } else { System.out.println(a); }
+    return x; } }"""
+
+PROG_B = """class B { int g(int p, int q) {
+    int y =  p+q;
+    /* renamed */ if (y > 0) { y = q; }
+    else { System.out.println( p ); }
+    return y; } }"""
+
+
+def cached_analysis(tmp_path, cache, name, prog):
+    (src := tmp_path / f'{name}.java').write_text(prog)
+    res = Result(str(src))
+    JavaAnalyzer(res, cache).parse().analyze()
+    return res
+
+
+def test_method_cache_hits_on_renamed_locals(tmp_path, mocker):
+    cache = MethodCache(solver='Z3')
+    mocker.patch.object(cache, 'memo', OrderedDict())
+    res_a = cached_analysis(tmp_path, cache, 'A', PROG_A)
+    Evaluate(res_a).solve_all()
+    cache.store(res_a)
+    spy = mocker.spy(RecVisitor, 'visit')
+    res_b = cached_analysis(tmp_path, cache, 'B', PROG_B)
+    spy.assert_not_called()
+    hit = res_b.analysis_result['B']['g']
+    assert hit.reused and hit.sat == 'SAT'
+    assert all(v in hit.model for v in ('l(p)', 'l(q)', 'l(y)'))
+    # same as uncached analysis
+    ref = cached_analysis(tmp_path, None, 'B', PROG_B)
+    ref = ref.analysis_result['B']['g']
+    assert sorted(hit.flows) == sorted(ref.flows)
+    assert sorted(hit.ids) == sorted(ref.ids)
+    assert hit.returns == ref.returns
+    assert hit.skips == ref.skips == ['System.out.println( p )']
+
+
+def test_parallel_solve_matches_serial():
+    results = []
+    for jobs in (1, 4):
+        res = Result('programs/switches/Program.java')
+        JavaAnalyzer(res).parse().analyze()
+        Evaluate(res).solve_all(res.timers.eval, jobs)
+        assert res.timers.eval['work_sec'] > 0
+        results.append({m.full_name: (m.sat, sorted(m.model.split(', ')))
+                        for c in res.analysis_result.values()
+                        for m in c.values() if m.ids})
+    assert len(results[0]) > 1 and results[0] == results[1]
+
+
+def test_phases_and_methods_are_timed(tmp_path):
+    res = Result('programs/switches/Program.java', str(tmp_path / 'r.json'))
+    tms = res.timers
+    JavaAnalyzer(res).parse(tms.parse, tms.lex).analyze(tms.analysis)
+    Evaluate(res).solve_all(tms.eval)
+    assert tms.lex['sec'] > 0 and tms.parse['sec'] > 0
+    assert all(tm['cpu_sec'] >= 0 for tm in (tms.analysis, tms.eval))
+    saved = json.loads(open(res.save().outfile).read())
+    assert saved['timing']['Parsing']['ms'] == tms.parse['ms']
+    methods = [m for c in saved['analysis_result'].values()
+               for m in c.values() if m['vars']]
+    assert methods and all(m['timing']['analysis'] >= 0 and
+                           m['timing']['solve'] > 0 for m in methods)
+
+
+def test_budget_exhausted_gives_unknown():
+    res = Result('programs/switches/Program.java')
+    JavaAnalyzer(res).parse().analyze()
+    Evaluate(res, budget=0).solve_all(res.timers.eval)
+    methods = [m for c in res.analysis_result.values()
+               for m in c.values() if m.ids]
+    assert methods and all(m.sat == 'UNKNOWN' for m in methods)
+    assert all(m.elapsed == 0 and m.model is None for m in methods)
+    assert 'UNKNOWN (after 0.0 sec)' in str(methods[0])
+
+
+def test_policy_verdicts_per_method(tmp_path):
+    (fn := tmp_path / 'policy.json').write_text(json.dumps([
+        {'name': 'h-low', 'match': '*.example', 'levels': {'h': 1, 'y': 0}},
+        {'name': 'z-high', 'levels': {'z': 1, 'h': 0}},
+        {'name': 'none', 'levels': {'nope': 1}}]))
+    res = Result('programs/ifcex1/Program.java')
+    JavaAnalyzer(res).parse().analyze()
+    Evaluate(res, policies=Policy.load(str(fn))).solve_all()
+    method = res.analysis_result['Program']['example']
+    assert method.policies == {'h-low': 'UNSAT', 'z-high': 'SAT'}
+    assert method.violations == {'h-low': [['h', 'y']]}
+    assert res.analysis_result['Program']['main'].policies is None
+
+
+def test_selected_methods_parse_only_bodies(tmp_path):
+    (fn := tmp_path / 'Program.java').write_text('''
+        public class Program {
+            private Runnable r = new Runnable() {
+                public void run() { int q = 1; } };
+            static { int s = 0; }
+            public static <K> Map<K, List<int[]>> generic(K k, int x)
+                    throws Exception { int y = x; return null; }
+            Program() { int z = 0; }
+            int[] arr(int a)[] { int b = a; return null; }
+            abstract static class Inner {
+                abstract void nothing();
+                java.lang.String get(String s) { String u = s; return u; }
+                class Deeper { void get(int d) { int e = d; } }
+            }
+            interface I { default void dm(int x) { int y = x; } }
+            enum E { A, B; void em() { int k = 0; } }
+            void lambdas(List<Integer> l) {
+                l.forEach(x -> { int y = x; });
+                class Local { void lm() {} }
+            }
+        }''')
+
+    def methods(select=None):
+        res = Result(str(fn))
+        JavaAnalyzer(res, select=select).parse().analyze()
+        return {m.full_name: (sorted(m.ids), sorted(m.flows), m.source)
+                for c in res.analysis_result.values() for m in c.values()}
+
+    assert methods(['*']) == methods()
+    assert set(methods(['*.get', 'Program.ar*'])) == {
+        'Program.Inner.get', 'Program.Inner.Deeper.get', 'Program.arr'}
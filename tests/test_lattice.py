@@ -0,0 +1,76 @@
+import json
+import random
+
+import pytest
+
+from analysis import Evaluate, MethodResult
+from analysis.evaluate import Z3Session
+from analysis.lattice import Lattice
+from analysis.policy import Policy
+
+DIAMOND = Lattice(['low', 'A', 'B', 'high'], [
+    ['low', 'A'], ['low', 'B'], ['A', 'high'], ['B', 'high']])
+
+
+def test_lattice_order_and_joins():
+    low, a, b, high = range(4)
+    assert DIAMOND.bottom == low
+    assert DIAMOND.join(a, b) == high and DIAMOND.join(low, a) == a
+    assert DIAMOND.leq(low, high) and not DIAMOND.leq(a, b)
+    assert DIAMOND.width == 2  # A and B are join-irreducible
+    ps = Lattice.powerset(['x', 'y', 'z'])
+    assert len(ps.elements) == 8 and ps.width == 3
+    assert ps.elements[ps.join(ps.index['{x}'], ps.index['{y,z}'])] == \
+        '{x,y,z}'
+
+
+def test_not_a_lattice():
+    with pytest.raises(ValueError):  # no bottom
+        Lattice(['a', 'b'], [])
+    with pytest.raises(ValueError):  # cycle
+        Lattice(['a', 'b'], [['a', 'b'], ['b', 'a']])
+    with pytest.raises(ValueError):  # a, b have two minimal upper bounds
+        Lattice(['z', 'a', 'b', 'c', 'd'], [
+            ['z', 'a'], ['z', 'b'], ['a', 'c'], ['a', 'd'],
+            ['b', 'c'], ['b', 'd']])
+
+
+def test_bitvector_encoding_agrees_with_propagation():
+    rnd, session = random.Random(5), Z3Session()
+    for lattice in (DIAMOND, Lattice.powerset(['x', 'y'])):
+        for _ in range(30):
+            n = rnd.randint(1, 6)
+            vrs = [f'v{i}' for i in range(n)]
+            flows = list({(a, b) for a, b in (
+                (rnd.choice(vrs), rnd.choice(vrs)) for _ in range(8))
+                if a != b})
+            method = MethodResult('C.m', '', flows, vrs)
+            levels = [{v: rnd.randrange(len(lattice.elements))
+                       for v in rnd.sample(vrs, rnd.randint(1, n))}
+                      for _ in range(3)]
+            native = Evaluate.check_policies(
+                method, levels, session, 'native', lattice)
+            assert native == Evaluate.check_policies(
+                method, levels, session, 'z3', lattice)
+            assert native == session.check_policies(method, levels, lattice)
+            assert native == [
+                'UNSAT' if Evaluate.violations(method, lv, lattice)
+                else 'SAT' for lv in levels]
+
+
+def test_lattice_policies(tmp_path):
+    (fn := tmp_path / 'policy.json').write_text(json.dumps([
+        {'name': 'ok', 'levels': {'a': 'A', 'c': 'high'}},
+        {'name': 'leak', 'levels': {'a': 'A', 'c': 'B'}}]))
+    method = MethodResult('C.m', '', [('a', 'b'), ('b', 'c')],
+                          ['a', 'b', 'c'])
+    policies = Policy.load(str(fn), DIAMOND)
+    levels = [p.levels for p in policies]
+    assert Evaluate.check_policies(
+        method, levels, None, 'check', DIAMOND) == ['SAT', 'UNSAT']
+    assert Evaluate.violations(method, levels[1], DIAMOND) == [
+        ['a', 'b', 'c']]
+    (fn := tmp_path / 'bad.json').write_text(json.dumps([
+        {'levels': {'a': 'secret'}}]))
+    with pytest.raises(ValueError):
+        Policy.load(str(fn), DIAMOND)
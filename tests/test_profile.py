@@ -0,0 +1,45 @@
+from antlr4 import PredictionContextCache
+from antlr4.dfa.DFA import DFA
+
+from analysis.analyzer.profile import profile
+from analysis.parser import JavaParser
+
+
+def cold_dfa(monkeypatch):
+    atn = JavaParser.atn
+    monkeypatch.setattr(JavaParser, 'decisionsToDFA', [
+        DFA(ds, i) for i, ds in enumerate(atn.decisionToState)])
+    monkeypatch.setattr(
+        JavaParser, 'sharedContextCache', PredictionContextCache())
+    return atn
+
+
+def test_profile_ranks_decisions_by_rule(monkeypatch, tmp_path):
+    atn = cold_dfa(monkeypatch)
+    (bad := tmp_path / 'Bad.java').write_text('class B { void f() { ; ( } }')
+    files = ['programs/switches/Program.java', 'programs/mvt/Program.java']
+    prof = profile(files + [str(bad)])
+    assert list(prof.files) == files + [str(bad)]
+    assert list(prof.failed) == [str(bad)] and prof.ll_files >= 2
+    ranked = prof.ranked()
+    assert ranked and all(a['time_ns'] >= b['time_ns']
+                          for a, b in zip(ranked, ranked[1:]))
+    assert all(JavaParser.ruleNames[atn.decisionToState[
+        d['decision']].ruleIndex] == d['rule'] for d in ranked)
+    # a cold DFA is built by simulating the ATN
+    assert sum(d['atn_transitions'] for d in ranked) > 0
+    rules = {r['rule']: r for r in prof.rules()}
+    assert rules['expression']['invocations'] == sum(
+        d['invocations'] for d in ranked if d['rule'] == 'expression')
+    assert 'expression' in prof.report()
+
+
+def test_profile_finds_full_context_predictions(monkeypatch):
+    cold_dfa(monkeypatch)
+    prof = profile(['programs/mvt/Program.java'])
+    assert prof.files == {'programs/mvt/Program.java': 'LL'}
+    rules = {r['rule']: r for r in prof.rules()}
+    # parsed in SLL mode, these would all be 0
+    assert rules['expression']['ll_fallbacks'] > 0
+    assert sum(r['ambiguities'] for r in rules.values()) > 0
+    assert sum(r['context_sensitivities'] for r in rules.values()) > 0
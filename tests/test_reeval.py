@@ -0,0 +1,66 @@
+import json
+import zipfile
+from argparse import Namespace
+
+from analysis import Result, Evaluate
+from analysis.analyzer import JavaAnalyzer
+from analysis.query import query
+from analysis.reeval import saved_results, reevaluate, run
+
+
+def saved(prog: str) -> str:
+    res = Result(f'programs/{prog}/Program.java')
+    JavaAnalyzer(res).parse().analyze()
+    Evaluate(res).solve_all()
+    return json.dumps(res)
+
+
+def config(**kwargs):
+    default = {'input': None, 'solver': 'z3', 'policy': None,
+               'lattice': None,
+               'reduce': None, 'timeout': None, 'jobs': 1}
+    return Namespace(**dict({**default, **kwargs}))
+
+
+def test_reeval_reports_only_changes(tmp_path):
+    text = saved('ifcex1')
+    assert reevaluate(('a.json', text), config()) == []
+    assert reevaluate(('a.json', text), config(solver='native')) == []
+    (fn := tmp_path / 'policy.json').write_text(json.dumps([
+        {'name': 'h-low', 'levels': {'h': 1, 'y': 0}}]))
+    assert reevaluate(('a.json', text), config(policy=str(fn))) == [
+        ('a.json', 'Program.example', 'h-low', None, 'UNSAT')]
+
+
+def test_reeval_reads_archives(tmp_path):
+    with zipfile.ZipFile(arc := tmp_path / 'saved.zip', 'w') as zf:
+        zf.writestr('b/ifcex1.json', saved('ifcex1'))
+        zf.writestr('a/broken.json', '{')
+        zf.writestr('README', 'not a result')
+    assert [n for n, _ in saved_results(str(arc))] == \
+        ['a/broken.json', 'b/ifcex1.json']
+    assert run(config(input=str(arc))) == []
+
+
+def test_query_saved_results(tmp_path):
+    (tmp_path / 'sqlinject.json').write_text(saved('sqlinject'))
+    (tmp_path / 'ifcex1.json').write_text(saved('ifcex1'))
+    found = list(query(str(tmp_path), 'request', '*'))
+    assert found == [
+        ('programs/sqlinject/Program.java', 'Program.example',
+         'request', 'sb1'),
+        ('programs/sqlinject/Program.java', 'Program.example',
+         'request', 'user')]
+    assert list(query(str(tmp_path), 'sb1', 'request')) == []
+
+
+def test_reeval_loads_policies_once(tmp_path, mocker):
+    from analysis.policy import Policy
+    for prog in ('ifcex1', 'sqlinject'):
+        (tmp_path / f'{prog}.json').write_text(saved(prog))
+    (fn := tmp_path / 'policy.txt').write_text(json.dumps([
+        {'name': 'h-low', 'levels': {'h': 1, 'y': 0}}]))
+    spy = mocker.spy(Policy, 'load')
+    run(config(input=str(tmp_path), policy=str(fn)))
+    run(config(input=str(tmp_path), policy=str(fn)))
+    assert spy.call_count == 1